@@ -0,0 +1,44 @@
+"""平衡模型打分延迟基准：已加载模型打分 vs 每批重新拟合"""
+from typing import Any, Dict
+import time
+import numpy as np
+from sklearn.ensemble import IsolationForest
+from sklearn.preprocessing import StandardScaler
+from mas_system.agents.balance_models import BalanceModelManager
+
+def _features(rng, count: int) -> np.ndarray:
+    return np.column_stack([
+        rng.normal(250, 60, count),
+        rng.integers(1, 6, count),
+        (rng.random(count) < 0.55).astype(float),
+    ])
+
+def _timed_ms(fn, repeats: int) -> float:
+    t0 = time.perf_counter()
+    for _ in range(repeats):
+        fn()
+    return (time.perf_counter() - t0) / repeats * 1000
+
+def run(quick: bool = False) -> Dict[str, Any]:
+    rng = np.random.default_rng(0)
+    manager = BalanceModelManager("models/bench_balancer")
+    t0 = time.perf_counter()
+    manager.fit(_features(rng, 20000))
+    results = {"fit_20000_seconds": time.perf_counter() - t0}
+
+    # 模拟重启后的预热加载
+    restarted = BalanceModelManager("models/bench_balancer")
+    t0 = time.perf_counter()
+    restarted.load_latest()
+    results["warm_start_ms"] = (time.perf_counter() - t0) * 1000
+
+    repeats = 5 if quick else 20
+    for batch in (10, 100, 1000, 10000):
+        features = _features(rng, batch)
+        results[f"score_batch{batch}_ms"] = _timed_ms(lambda: restarted.score(features), repeats)
+        if batch <= 1000:
+            def refit():
+                scaled = StandardScaler().fit_transform(features)
+                IsolationForest(contamination=0.1).fit_predict(scaled)
+            results[f"refit_batch{batch}_ms"] = _timed_ms(refit, max(1, repeats // 5))
+    return results
@@ -0,0 +1,46 @@
+"""游戏平衡Agent实时接入速率和离线分析规模基准"""
+from typing import Any, Dict
+import time
+import numpy as np
+import pandas as pd
+from mas_system.core.controller import CentralController
+from mas_system.agents.game_balancer import GameBalancerAgent
+
+def _events(rng, count: int) -> pd.DataFrame:
+    return pd.DataFrame({
+        "completion_time": rng.normal(250, 60, count),
+        "attempts": rng.integers(1, 6, count),
+        "success": (rng.random(count) < 0.55).astype(int),
+        "fail_location": rng.choice(["桥", "洞穴", "城门", "塔顶"], count),
+    })
+
+def run(quick: bool = False) -> Dict[str, Any]:
+    rng = np.random.default_rng(0)
+    results = {}
+    controller = CentralController(None)
+    agent = GameBalancerAgent("bench_balancer", controller)
+
+    # 逐条经控制器接入（原有路径）
+    count = 200 if quick else 1000
+    events = _events(rng, count).to_dict("records")
+    t0 = time.perf_counter()
+    for event in events:
+        controller.execute_task(agent.agent_id, {"type": "real_time_analysis", "player_data": event})
+    results["realtime_single_events_per_sec"] = count / (time.perf_counter() - t0)
+
+    # 批量接入
+    batch_count = 20000 if quick else 200000
+    frame = _events(rng, batch_count)
+    t0 = time.perf_counter()
+    for start in range(0, batch_count, 1000):
+        agent.ingest_batch(frame.iloc[start:start + 1000])
+    results["realtime_batch_events_per_sec"] = batch_count / (time.perf_counter() - t0)
+
+    # analyze_player_data随数据规模的耗时
+    for rows in ((10000, 100000) if quick else (10000, 100000, 1000000)):
+        data = _events(rng, rows).to_dict("list")
+        t0 = time.perf_counter()
+        agent.run_task({"type": "analyze_data", "player_data": data})
+        results[f"analyze_{rows}_rows_seconds"] = time.perf_counter() - t0
+    agent.close()
+    return results
@@ -0,0 +1,40 @@
+"""中央控制器任务分发吞吐基准"""
+from typing import Any, Dict
+import time
+from mas_system.core.controller import CentralController
+from mas_system.core.base_agent import BaseAgent
+
+class EchoAgent(BaseAgent):
+    """只回显任务的空实现，用于测量控制器自身开销"""
+
+    def process_task(self):
+        return {"status": "completed", "task_id": self.current_task.get("task_id")}
+
+def _rate(count: int, seconds: float) -> float:
+    return count / seconds if seconds > 0 else float("inf")
+
+def run(quick: bool = False) -> Dict[str, Any]:
+    n = 2000 if quick else 20000
+    results = {}
+
+    for journal in (False, True):
+        suffix = "journal" if journal else "memory"
+        controller = CentralController("data/bench_journal.jsonl" if journal else None)
+        agents = [EchoAgent(f"echo_{i}", controller) for i in range(4)]
+        count = n // 10 if journal else n  # 日志每条fsync，数量减少
+
+        t0 = time.perf_counter()
+        for i in range(count):
+            controller.dispatch_task({"type": "echo", "agent_type": "EchoAgent"})
+        results[f"dispatch_{suffix}_per_sec"] = _rate(count, time.perf_counter() - t0)
+
+        t0 = time.perf_counter()
+        controller.run_queued_tasks()
+        results[f"run_queued_{suffix}_per_sec"] = _rate(count, time.perf_counter() - t0)
+
+        t0 = time.perf_counter()
+        for i in range(count):
+            controller.execute_task(agents[i % len(agents)].agent_id, {"type": "echo"})
+        results[f"execute_{suffix}_per_sec"] = _rate(count, time.perf_counter() - t0)
+
+    return results
@@ -0,0 +1,64 @@
+"""语义对话缓存查询延迟基准
+
+用法（在仓库根目录）：python -m benchmarks.bench_dialogue_cache --entries 1000000
+"""
+from typing import Any, Dict
+import argparse
+import json
+import time
+import numpy as np
+from mas_system.agents.dialogue_cache import SemanticDialogueCache
+
+def _random_texts(rng, count: int, min_len: int = 6, max_len: int = 14):
+    # 常用汉字区间内随机组合，模拟玩家输入
+    lengths = rng.integers(min_len, max_len + 1, size=count)
+    codes = rng.integers(0x4E00, 0x4E00 + 3000, size=int(lengths.sum()))
+    chars = [chr(c) for c in codes.tolist()]
+    texts, pos = [], 0
+    for n in lengths.tolist():
+        texts.append("".join(chars[pos:pos + n]))
+        pos += n
+    return texts
+
+def run(entries: int = 1000000, queries: int = 2000, seed: int = 0) -> Dict[str, Any]:
+    rng = np.random.default_rng(seed)
+    cache = SemanticDialogueCache(capacity=entries)
+
+    texts = _random_texts(rng, entries)
+    t0 = time.perf_counter()
+    cache.add_many((text, i) for i, text in enumerate(texts))
+    build_seconds = time.perf_counter() - t0
+
+    # 一半查询为已有输入的轻微改写（删掉一个字），一半为新输入
+    picks = rng.integers(0, entries, size=queries // 2)
+    near = [texts[i][:-1] for i in picks.tolist()]
+    fresh = _random_texts(rng, queries - len(near))
+    latencies = []
+    for text in near + fresh:
+        t0 = time.perf_counter()
+        cache.lookup(text)
+        latencies.append((time.perf_counter() - t0) * 1000)
+    latencies = np.array(latencies)
+
+    return {
+        "entries": len(cache),
+        "build_seconds": build_seconds,
+        "index_mb": (cache.signatures.nbytes + cache.band_keys.nbytes + cache.last_used.nbytes) / 2 ** 20,
+        "lookup_ms": {
+            "mean": float(latencies.mean()),
+            "p50": float(np.percentile(latencies, 50)),
+            "p95": float(np.percentile(latencies, 95)),
+            "p99": float(np.percentile(latencies, 99)),
+        },
+        "near_duplicate_hit_rate": cache.stats["hits"] / max(len(near), 1),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="语义对话缓存查询延迟基准")
+    parser.add_argument("--entries", type=int, default=1000000)
+    parser.add_argument("--queries", type=int, default=2000)
+    args = parser.parse_args()
+    print(json.dumps(run(args.entries, args.queries), ensure_ascii=False, indent=2))
+
+if __name__ == "__main__":
+    main()
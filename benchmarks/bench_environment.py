@@ -0,0 +1,25 @@
+"""场景图下载保存吞吐基准"""
+from typing import Any, Dict
+import time
+from mas_system.core.controller import CentralController
+from mas_system.agents.environment_generator import EnvironmentGeneratorAgent
+
+def run(quick: bool = False, image_bytes: bytes = b"") -> Dict[str, Any]:
+    agent = EnvironmentGeneratorAgent("bench_env", CentralController(None))
+    results = {}
+
+    count = 10 if quick else 50
+    t0 = time.perf_counter()
+    for i in range(count):
+        agent.run_task({"type": "scene_generation", "scene_prompt": f"森林中的第{i}座神殿"})
+    elapsed = time.perf_counter() - t0
+    results["scene_save_per_sec"] = count / elapsed
+    results["scene_save_mb_per_sec"] = count * len(image_bytes) / 2 ** 20 / elapsed
+
+    count = 20 if quick else 100
+    t0 = time.perf_counter()
+    for i in range(count):
+        agent.run_task({"type": "scene_generation", "scene_prompt": f"雨夜城市{i}", "offline": True})
+    results["procedural_preview_ms"] = (time.perf_counter() - t0) / count * 1000
+    agent.close()
+    return results
@@ -0,0 +1,33 @@
+"""NPC对话轮次延迟基准（含对话历史持久化）"""
+from typing import Any, Dict
+import time
+import numpy as np
+from mas_system.core.controller import CentralController
+from mas_system.core.memory_budget import MemoryBudget
+from mas_system.agents.npc_agent import NPCAgent
+
+def run(quick: bool = False) -> Dict[str, Any]:
+    results = {}
+    turns = 50 if quick else 200
+    for history_size in ((100, 1000) if quick else (100, 1000, 10000)):
+        # 预算容纳全部历史，避免超出默认上限的轮次被归档而使各组测量相同的内存历史
+        controller = CentralController(None, memory_budget=MemoryBudget(dialogue_turns=history_size + turns))
+        agent = NPCAgent(f"bench_npc_{history_size}", controller)
+        agent.dialogue_history.load(
+            {"player_input": f"历史输入{i}", "npc_response": f"历史回应{i}" * 10}
+            for i in range(history_size)
+        )
+        agent.semantic_cache.threshold = 1.01  # 关闭语义缓存复用，只测量模型路径
+        latencies = []
+        for i in range(turns):
+            # 每轮输入都不同，避免命中预生成池
+            task = {"type": "dialogue", "context": f"第{history_size}组第{i}轮：{i * 7919 % 104729}号商队的消息"}
+            t0 = time.perf_counter()
+            agent.run_task(task)
+            latencies.append((time.perf_counter() - t0) * 1000)
+        latencies = np.array(latencies)
+        results[f"turn_history{history_size}_p50_ms"] = float(np.percentile(latencies, 50))
+        results[f"turn_history{history_size}_p95_ms"] = float(np.percentile(latencies, 95))
+        results[f"turn_history{history_size}_cache_hits"] = agent.semantic_cache.stats["hits"]
+        agent.close()
+    return results
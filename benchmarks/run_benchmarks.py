@@ -0,0 +1,137 @@
+"""多智能体系统基准测试套件（离线，模型服务使用桩）
+
+用法（在仓库根目录）：
+    python -m benchmarks.run_benchmarks                 # 完整运行
+    python -m benchmarks.run_benchmarks --quick         # 缩小规模快速运行
+    python -m benchmarks.run_benchmarks --only npc,controller
+    python -m benchmarks.run_benchmarks --baseline benchmarks/results/baseline.json
+
+结果保存为JSON，指定基准文件时比较各指标并标记回退（超过容差时退出码为1）。
+指标名以_per_sec结尾表示越大越好，以_ms或_seconds结尾表示越小越好。
+"""
+from typing import Any, Dict, List
+from datetime import datetime
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+
+from . import (bench_controller, bench_npc, bench_balancer, bench_environment,
+               bench_dialogue_cache, bench_balance_models)
+from .stubs import stub_providers, make_png_bytes
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+def _suites(quick: bool, image_bytes: bytes):
+    return {
+        "controller": lambda: bench_controller.run(quick),
+        "npc": lambda: bench_npc.run(quick),
+        "balancer": lambda: bench_balancer.run(quick),
+        "environment": lambda: bench_environment.run(quick, image_bytes),
+        "balance_models": lambda: bench_balance_models.run(quick),
+        "dialogue_cache": lambda: _flatten(bench_dialogue_cache.run(100000 if quick else 1000000)),
+    }
+
+def _flatten(metrics: Dict[str, Any], prefix: str = "") -> Dict[str, float]:
+    flat = {}
+    for key, value in metrics.items():
+        if isinstance(value, dict):
+            flat.update(_flatten(value, f"{prefix}{key}_"))
+        elif isinstance(value, (int, float)):
+            flat[f"{prefix}{key}"] = value
+    return flat
+
+def _direction(metric: str) -> int:
+    """1表示越大越好，-1表示越小越好，0表示不比较"""
+    if metric.endswith("_per_sec"):
+        return 1
+    if metric.endswith("_ms") or metric.endswith("_seconds") or "_ms_" in metric:
+        return -1
+    return 0
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[Dict[str, Any]]:
+    """比较两次运行结果，返回超出容差的回退项"""
+    regressions = []
+    for suite, metrics in current["results"].items():
+        for metric, value in metrics.items():
+            old = baseline.get("results", {}).get(suite, {}).get(metric)
+            direction = _direction(metric)
+            if old is None or direction == 0 or not old:
+                continue
+            change = (value - old) / abs(old)
+            if change * direction < -tolerance:
+                regressions.append({
+                    "suite": suite,
+                    "metric": metric,
+                    "baseline": old,
+                    "current": value,
+                    "change": round(change, 4)
+                })
+    return regressions
+
+def run(only: List[str] = None, quick: bool = False) -> Dict[str, Any]:
+    image_bytes = make_png_bytes()
+    suites = _suites(quick, image_bytes)
+    selected = only or list(suites)
+    unknown = [name for name in selected if name not in suites]
+    if unknown:
+        raise ValueError(f"未知的基准: {unknown}")
+
+    report = {
+        "timestamp": datetime.now().isoformat(),
+        "quick": quick,
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "results": {},
+        "durations": {},
+    }
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as workdir, stub_providers(image_bytes=image_bytes):
+        os.chdir(workdir)  # 对话历史、图片等文件写入临时目录
+        try:
+            for name in selected:
+                print(f"运行基准: {name} ...", file=sys.stderr)
+                t0 = time.perf_counter()
+                with contextlib.redirect_stdout(io.StringIO()):
+                    report["results"][name] = suites[name]()
+                report["durations"][name] = time.perf_counter() - t0
+        finally:
+            os.chdir(cwd)
+    return report
+
+def main():
+    parser = argparse.ArgumentParser(description="多智能体系统基准测试")
+    parser.add_argument("--quick", action="store_true", help="缩小数据规模")
+    parser.add_argument("--only", default="", help="逗号分隔的基准名称")
+    parser.add_argument("--output", default="", help="结果文件路径，默认写入benchmarks/results/")
+    parser.add_argument("--baseline", default="", help="用于比较的历史结果文件")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="允许的相对退化比例")
+    args = parser.parse_args()
+
+    report = run([s for s in args.only.split(",") if s], args.quick)
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            report["regressions"] = compare(report, json.load(f), args.tolerance)
+        report["baseline"] = args.baseline
+
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"bench_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    )
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+    print(json.dumps(report["results"], ensure_ascii=False, indent=2))
+    print(f"结果已保存: {output}")
+    for item in report.get("regressions", []):
+        print(f"性能回退: {item['suite']}.{item['metric']} {item['baseline']:.4g} -> {item['current']:.4g} ({item['change']:+.1%})")
+    if report.get("regressions"):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""内存浸泡测试：在内存预算下模拟24小时的持续负载，检查进程RSS在预热后保持平稳
+
+每个模拟步代表1分钟：NPC对话、遥测批次、天气变化和任务突发都经控制器队列执行，
+每模拟1小时采样一次RSS和各智能体的内存报告。
+
+用法（在仓库根目录）：
+    python -m benchmarks.soak_memory                 # 模拟24小时，每小时60步
+    python -m benchmarks.soak_memory --quick         # 每小时12步
+"""
+from typing import Any, Dict
+import argparse
+import contextlib
+import gc
+import io
+import json
+import os
+import tempfile
+import numpy as np
+import pandas as pd
+from mas_system.core.controller import CentralController
+from mas_system.core.memory_budget import MemoryBudget, process_rss
+from mas_system.agents.npc_agent import NPCAgent
+from mas_system.agents.game_balancer import GameBalancerAgent
+from mas_system.agents.environment_generator import EnvironmentGeneratorAgent
+from mas_system.agents.content_generator import ContentGeneratorAgent
+from .stubs import stub_providers
+
+# 缩小的预算，使各结构在模拟的前几个小时内达到上限
+SOAK_BUDGET = MemoryBudget(
+    dialogue_turns=50,
+    semantic_cache_entries=200,
+    warm_pool_keys=500,
+    adjustment_history=200,
+    player_data_rows=5000,
+    task_queue=100,
+    scene_jobs=50,
+)
+
+def _events(rng, count: int):
+    return {
+        "completion_time": rng.normal(250, 60, count).tolist(),
+        "attempts": rng.integers(1, 6, count).tolist(),
+        "success": (rng.random(count) < 0.55).astype(int).tolist(),
+    }
+
+def run(quick: bool = False, hours: int = 24, steps_per_hour: int = 0) -> Dict[str, Any]:
+    steps_per_hour = steps_per_hour or (12 if quick else 60)
+    rng = np.random.default_rng(0)
+    controller = CentralController(None, memory_budget=SOAK_BUDGET)
+    npcs = [NPCAgent(f"soak_npc_{i}", controller) for i in range(2)]
+    balancer = GameBalancerAgent("soak_balancer", controller)
+    env = EnvironmentGeneratorAgent("soak_env", controller)
+    content = ContentGeneratorAgent("soak_content", controller)  # 订阅平衡建议
+
+    hourly_rss = []
+    turns = 0
+    for hour in range(hours):
+        for step in range(steps_per_hour):
+            minute = hour * 60 + step
+            for npc in npcs:
+                for k in range(3):
+                    # 输入各不相同，持续写入对话历史和语义缓存
+                    controller.dispatch_task({
+                        "type": "dialogue",
+                        "agent_id": npc.agent_id,
+                        "context": f"第{minute}分钟第{k}位玩家询问{int(rng.integers(1e9))}号商队的消息"
+                    })
+                    turns += 1
+            controller.dispatch_task({
+                "type": "real_time_batch",
+                "agent_id": balancer.agent_id,
+                "events": _events(rng, 20)
+            })
+            if step % 10 == 0:
+                controller.dispatch_task({"type": "weather_system", "agent_id": env.agent_id})
+            controller.run_queued_tasks()
+
+        # 每小时一次：超过队列上限的任务突发（部分写入磁盘）和整批玩家数据分析
+        for _ in range(SOAK_BUDGET.task_queue * 3):
+            controller.dispatch_task({"type": "weather_system", "agent_id": env.agent_id})
+        controller.run_queued_tasks()
+        controller.execute_task(balancer.agent_id, {
+            "type": "analyze_data",
+            "player_data": pd.DataFrame(_events(rng, 20000)).to_dict("list")
+        })
+        gc.collect()
+        hourly_rss.append(process_rss() / 2 ** 20)
+        controller.memory_report()
+
+    report = controller.memory_report()
+    for agent in npcs + [balancer, env, content]:
+        agent.close()
+    warm_hour = max(hours // 4, 1)  # 前1/4时间为预热，各结构在此期间达到上限
+    growth = hourly_rss[-1] - hourly_rss[warm_hour - 1]
+    return {
+        "simulated_hours": hours,
+        "dialogue_turns": turns,
+        "rss_start_mb": hourly_rss[0],
+        "rss_warm_mb": hourly_rss[warm_hour - 1],
+        "rss_end_mb": hourly_rss[-1],
+        "rss_growth_after_warmup_mb": growth,
+        "rss_growth_after_warmup_pct": growth / hourly_rss[warm_hour - 1] * 100,
+        "npc_history_in_memory": len(npcs[0].dialogue_history),
+        "npc_history_archived": npcs[0].dialogue_history.archived,
+        "adjustment_history": len(balancer.adjustment_history),
+        "player_data_rows": len(balancer.player_data),
+        "final_report": report,
+        "hourly_rss_mb": [round(value, 2) for value in hourly_rss],
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="内存浸泡测试")
+    parser.add_argument("--quick", action="store_true", help="减少每小时的模拟步数")
+    parser.add_argument("--hours", type=int, default=24, help="模拟的小时数")
+    parser.add_argument("--max-growth", type=float, default=5.0, help="预热后允许的RSS增长百分比")
+    args = parser.parse_args()
+
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as workdir, stub_providers():
+        os.chdir(workdir)
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                result = run(args.quick, args.hours)
+        finally:
+            os.chdir(cwd)
+
+    summary = {key: value for key, value in result.items() if key != "final_report"}
+    print(json.dumps(summary, ensure_ascii=False, indent=2))
+    if result["rss_growth_after_warmup_pct"] > args.max_growth:
+        print(f"RSS在预热后增长{result['rss_growth_after_warmup_pct']:.1f}%，超过{args.max_growth}%")
+        raise SystemExit(1)
+    print("RSS保持平稳")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""离线基准使用的模型服务桩：替换DashScope和HTTP调用，返回固定格式的响应"""
+from types import SimpleNamespace
+from contextlib import contextmanager
+from http import HTTPStatus
+from unittest import mock
+import io
+import os
+import time
+import numpy as np
+import dashscope
+import requests
+from PIL import Image
+
+def _message_response(content: str):
+    return SimpleNamespace(
+        status_code=HTTPStatus.OK,
+        message="",
+        output=SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+    )
+
+def fake_generation_call(latency: float = 0.0):
+    def call(model=None, messages=None, **kwargs):
+        if latency:
+            time.sleep(latency)
+        system = messages[0]["content"] if messages else ""
+        if "情感倾向" in system:
+            return _message_response("{'label': 'positive', 'score': 0.8}")
+        return _message_response(f"*点头* 你好，旅行者。关于“{messages[-1]['content'][:20]}”，我知道一些事情。")
+    return call
+
+def fake_image_call(latency: float = 0.0):
+    def call(model=None, prompt=None, **kwargs):
+        if latency:
+            time.sleep(latency)
+        return SimpleNamespace(
+            status_code=HTTPStatus.OK,
+            output=SimpleNamespace(results=[SimpleNamespace(url="https://example.invalid/scene.png")])
+        )
+    return call
+
+def make_png_bytes(size: int = 1024, seed: int = 0) -> bytes:
+    """生成与wanx-v1输出尺寸相同的PNG数据（噪声图，接近真实图片体积）"""
+    rng = np.random.default_rng(seed)
+    image = rng.integers(0, 256, size=(size, size, 3), dtype=np.uint8)
+    buffer = io.BytesIO()
+    Image.fromarray(image).save(buffer, format="PNG", compress_level=1)
+    return buffer.getvalue()
+
+def fake_http_get(content: bytes):
+    def get(url, *args, **kwargs):
+        response = mock.Mock()
+        response.status_code = 200
+        response.content = content
+        response.raise_for_status = lambda: None
+        return response
+    return get
+
+@contextmanager
+def stub_providers(llm_latency: float = 0.0, image_latency: float = 0.0, image_bytes: bytes = b""):
+    """在上下文内替换所有外部模型调用，并设置占位API密钥"""
+    env = {"DASHSCOPE_API_KEY": "bench", "DEEPSEEK_API_KEY": "bench"}
+    with mock.patch.dict(os.environ, env), \
+         mock.patch.object(dashscope.Generation, "call", fake_generation_call(llm_latency)), \
+         mock.patch.object(dashscope.ImageSynthesis, "call", fake_image_call(image_latency)), \
+         mock.patch.object(requests, "get", fake_http_get(image_bytes)):
+        yield
@@ -0,0 +1,234 @@
+from typing import Any, Dict, Optional
+from datetime import datetime
+import os
+import json
+import shutil
+import threading
+import time
+import numpy as np
+import joblib
+from sklearn.cluster import KMeans
+from sklearn.ensemble import IsolationForest
+from sklearn.preprocessing import StandardScaler
+
+class BalanceModelManager:
+    """GameBalancerAgent模型生命周期管理：版本化持久化、启动预热、后台重训练
+
+    热路径只用已加载的模型打分，不做拟合。score()没有副作用；observe()记录真实
+    数据到特征环形缓冲区，没有任何可用模型时用首批数据同步拟合一次作为引导，
+    之后按时间间隔或检测到分布漂移时在后台线程中重训练并保存为新版本。
+    """
+
+    def __init__(self, model_dir: str = "models/game_balancer", refit_interval: float = 3600.0,
+                 drift_threshold: float = 4.0, buffer_size: int = 50000, min_refit_samples: int = 100,
+                 keep_versions: int = 5, contamination: float = 0.1, n_clusters: int = 3):
+        self.model_dir = model_dir
+        self.refit_interval = refit_interval      # 定时重训练间隔（秒）
+        self.drift_threshold = drift_threshold    # 批次均值偏离训练分布的z值阈值
+        self.min_refit_samples = min_refit_samples
+        self.keep_versions = keep_versions
+        self.contamination = contamination
+        self.n_clusters = n_clusters
+
+        self.version = 0
+        self.trained_at: Optional[float] = None
+        self.scaler: Optional[StandardScaler] = None
+        self.forest: Optional[IsolationForest] = None
+        self.kmeans: Optional[KMeans] = None
+
+        # 特征列：completion_time, attempts, success
+        self._buffer = np.zeros((buffer_size, 3), dtype=np.float64)
+        self._buffer_pos = 0
+        self._buffer_count = 0
+        self._lock = threading.Lock()
+        self._refit_thread: Optional[threading.Thread] = None
+        self._scheduler: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self.stats = {"refits": 0, "drift_refits": 0, "bootstrap_fits": 0}
+
+    @property
+    def ready(self) -> bool:
+        return self.forest is not None
+
+    def observe(self, features: np.ndarray):
+        """记录新数据用于后续重训练，并检查分布漂移；只应在真实数据的接收路径调用"""
+        features = np.asarray(features, dtype=np.float64)
+        if features.ndim != 2 or features.shape[1] != 3 or len(features) == 0:
+            return
+        with self._lock:
+            size = len(self._buffer)
+            if len(features) >= size:
+                features = features[-size:]
+            idx = (self._buffer_pos + np.arange(len(features))) % size
+            self._buffer[idx] = features
+            self._buffer_pos = int((self._buffer_pos + len(features)) % size)
+            self._buffer_count = min(self._buffer_count + len(features), size)
+
+        if not self.ready:
+            self._bootstrap(features)
+        elif self._drifted(features):
+            self.stats["drift_refits"] += 1
+            self.schedule_refit()
+
+    def _drifted(self, features: np.ndarray) -> bool:
+        scaler = self.scaler
+        scale = np.where(scaler.scale_ > 0, scaler.scale_, 1.0)
+        z = np.abs(features.mean(axis=0) - scaler.mean_) / (scale / np.sqrt(len(features)))
+        return bool(z.max() > self.drift_threshold)
+
+    def score(self, features: np.ndarray) -> np.ndarray:
+        """用已加载的模型做异常检测，-1表示异常
+
+        不记录数据、不拟合或保存模型；尚无模型时在当前批次上临时拟合，结果不保留。
+        """
+        features = np.asarray(features, dtype=np.float64)
+        with self._lock:
+            scaler, forest = self.scaler, self.forest
+        if forest is None:
+            scaler = StandardScaler().fit(features)
+            forest = IsolationForest(contamination=self.contamination).fit(scaler.transform(features))
+        return forest.predict(scaler.transform(features))
+
+    def cluster(self, X: np.ndarray, bootstrap: bool = True) -> np.ndarray:
+        """用已加载的KMeans模型划分难度级别；尚无模型且bootstrap为False时临时拟合，结果不保留"""
+        X = np.asarray(X, dtype=np.float64)
+        if self.kmeans is None and not bootstrap:
+            return KMeans(n_clusters=min(self.n_clusters, len(X)), n_init=10).fit_predict(X)
+        if self.kmeans is None:
+            with self._lock:
+                if self.kmeans is None:
+                    self.stats["bootstrap_fits"] += 1
+                    self.kmeans = KMeans(n_clusters=self.n_clusters, n_init=10).fit(X)
+        return self.kmeans.predict(X)
+
+    def _bootstrap(self, features: np.ndarray):
+        """尚无模型时用当前批次同步拟合一次"""
+        with self._lock:
+            if self.ready:
+                return
+            self.stats["bootstrap_fits"] += 1
+            scaler = StandardScaler().fit(features)
+            self.forest = IsolationForest(contamination=self.contamination).fit(scaler.transform(features))
+            self.scaler = scaler
+            self.trained_at = time.time()
+        self.schedule_refit()
+
+    def fit(self, data: Optional[np.ndarray] = None) -> bool:
+        """在缓冲区（或给定数据）上训练新模型并保存为新版本"""
+        if data is None:
+            with self._lock:
+                data = self._buffer[:self._buffer_count].copy()
+        if len(data) < max(self.min_refit_samples, self.n_clusters):
+            return False
+
+        scaler = StandardScaler().fit(data)
+        forest = IsolationForest(contamination=self.contamination).fit(scaler.transform(data))
+        kmeans = KMeans(n_clusters=self.n_clusters, n_init=10).fit(data[:, :2])
+        with self._lock:
+            self.scaler, self.forest, self.kmeans = scaler, forest, kmeans
+            self.trained_at = time.time()
+            self.stats["refits"] += 1
+        self.save(samples=len(data))
+        return True
+
+    def schedule_refit(self):
+        """在后台线程中重训练，已有重训练在进行时忽略"""
+        if self._refit_thread and self._refit_thread.is_alive():
+            return
+        self._refit_thread = threading.Thread(target=self._safe_fit, daemon=True)
+        self._refit_thread.start()
+
+    def _safe_fit(self):
+        try:
+            self.fit()
+        except Exception as e:
+            print(f"平衡模型重训练失败: {e}")
+
+    def start_scheduler(self, check_interval: float = 60.0):
+        """启动定时重训练线程"""
+        if self._scheduler and self._scheduler.is_alive():
+            return
+        self._stop.clear()
+
+        def loop():
+            while not self._stop.wait(check_interval):
+                if self.trained_at is None or time.time() - self.trained_at >= self.refit_interval:
+                    self.schedule_refit()
+
+        self._scheduler = threading.Thread(target=loop, daemon=True)
+        self._scheduler.start()
+
+    def stop_scheduler(self):
+        self._stop.set()
+
+    def save(self, samples: int = 0) -> str:
+        """保存为新版本目录，并清理过旧的版本"""
+        with self._lock:
+            self.version = max(self.version, self._latest_version()) + 1
+            version = self.version
+            models = {"scaler": self.scaler, "forest": self.forest, "kmeans": self.kmeans}
+        path = os.path.join(self.model_dir, f"v{version}")
+        tmp_path = path + ".tmp"
+        os.makedirs(tmp_path, exist_ok=True)
+        for name, model in models.items():
+            if model is not None:
+                joblib.dump(model, os.path.join(tmp_path, f"{name}.joblib"))
+        with open(os.path.join(tmp_path, "manifest.json"), "w", encoding="utf-8") as f:
+            json.dump({
+                "version": version,
+                "trained_at": datetime.fromtimestamp(self.trained_at or time.time()).isoformat(),
+                "samples": samples,
+                "feature_means": self.scaler.mean_.tolist() if self.scaler is not None else None,
+            }, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, path)
+
+        for old in self._versions()[:-self.keep_versions]:
+            shutil.rmtree(os.path.join(self.model_dir, f"v{old}"), ignore_errors=True)
+        return path
+
+    def load_latest(self) -> bool:
+        """启动时加载最新版本的模型"""
+        for version in reversed(self._versions()):
+            path = os.path.join(self.model_dir, f"v{version}")
+            try:
+                models = {
+                    name: joblib.load(os.path.join(path, f"{name}.joblib"))
+                    for name in ("scaler", "forest", "kmeans")
+                    if os.path.exists(os.path.join(path, f"{name}.joblib"))
+                }
+                with open(os.path.join(path, "manifest.json"), "r", encoding="utf-8") as f:
+                    manifest = json.load(f)
+            except Exception as e:
+                print(f"加载平衡模型v{version}失败: {e}")
+                continue
+            if "scaler" not in models or "forest" not in models:
+                continue
+            with self._lock:
+                self.scaler = models["scaler"]
+                self.forest = models["forest"]
+                self.kmeans = models.get("kmeans")
+                self.version = version
+                self.trained_at = datetime.fromisoformat(manifest["trained_at"]).timestamp()
+            return True
+        return False
+
+    def _versions(self):
+        if not os.path.isdir(self.model_dir):
+            return []
+        return sorted(
+            int(name[1:]) for name in os.listdir(self.model_dir)
+            if name.startswith("v") and name[1:].isdigit()
+        )
+
+    def _latest_version(self) -> int:
+        versions = self._versions()
+        return versions[-1] if versions else 0
+
+    def get_info(self) -> Dict[str, Any]:
+        return {
+            "version": self.version,
+            "ready": self.ready,
+            "trained_at": datetime.fromtimestamp(self.trained_at).isoformat() if self.trained_at else None,
+            "buffered_samples": self._buffer_count,
+            **self.stats,
+        }
@@ -0,0 +1,170 @@
+from typing import Dict, Any, List, Optional, Union
+import os
+import time
+import json
+import numpy as np
+import pandas as pd
+from datetime import datetime
+from sklearn.ensemble import IsolationForest
+from sklearn.preprocessing import StandardScaler
+from .game_balancer import (
+    GameBalancerAgent, DEFAULT_THRESHOLDS, REAL_TIME_RULES, ADJUSTMENT_RULES, ANOMALY_RULE,
+    evaluate_rules, hardest_cluster
+)
+
+FEATURE_COLUMNS = ["completion_time", "attempts", "success"]
+
+class BalanceReplay:
+    """将历史遥测数据加速回放到实时分析流程，对比多组阈值下的建议频率和延迟
+
+    异常检测只用agent已加载的模型打分（没有模型时在整批回放数据上临时拟合一次），不修改线上模型。
+    """
+
+    def __init__(self, agent: GameBalancerAgent,
+                 threshold_sets: Optional[Dict[str, Dict[str, float]]] = None,
+                 window: int = 10,
+                 speed: Optional[float] = None,
+                 detect_anomalies: bool = True):
+        self.agent = agent
+        self.threshold_sets = threshold_sets or {"default": dict(agent.thresholds)}
+        self.window = window                    # 与real_time_analysis一致，每10条分析一次
+        self.speed = speed                      # 回放倍速，None表示不等待、尽快回放
+        self.detect_anomalies = detect_anomalies
+
+    @staticmethod
+    def load_events(source: Union[str, List[Dict[str, Any]], pd.DataFrame]) -> pd.DataFrame:
+        """加载遥测记录，支持事件列表、DataFrame、JSON或JSONL文件"""
+        if isinstance(source, pd.DataFrame):
+            df = source
+        elif isinstance(source, str):
+            if not os.path.exists(source):
+                raise ValueError(f"遥测文件不存在: {source}")
+            if source.endswith(".jsonl"):
+                df = pd.read_json(source, lines=True)
+            else:
+                with open(source, "r", encoding="utf-8") as f:
+                    df = pd.DataFrame(json.load(f))
+        else:
+            df = pd.DataFrame(source)
+
+        missing = [c for c in FEATURE_COLUMNS if c not in df.columns]
+        if missing:
+            raise ValueError(f"遥测数据缺少字段: {missing}")
+        return df
+
+    def run(self, source) -> Dict[str, Any]:
+        """逐条事件走实时分析路径（累计窗口、统计、异常检测、生成建议），返回各阈值组的建议统计和逐事件延迟"""
+        df = self.load_events(source)
+        features = df[FEATURE_COLUMNS].to_numpy(dtype=np.float64)
+        n_windows = len(features) // self.window
+        used = n_windows * self.window
+        if self.detect_anomalies and n_windows:
+            score = self._scorer(features[:used])
+        else:
+            score = lambda batch: np.ones(len(batch), dtype=np.int64)
+
+        avg_completion_time = np.zeros(n_windows, dtype=np.float64)
+        success_rate = np.zeros(n_windows, dtype=np.float64)
+        anomaly_counts = np.zeros(n_windows, dtype=np.int64)
+        event_latency = np.zeros(used, dtype=np.float64)
+        window_latency = np.zeros(n_windows, dtype=np.float64)
+
+        records = df[FEATURE_COLUMNS].iloc[:used].to_dict("records")
+        offsets = self._replay_offsets(df, used)
+        buffer = []
+        started = time.perf_counter()
+        for i, record in enumerate(records):
+            if offsets is not None:
+                delay = offsets[i] - (time.perf_counter() - started)
+                if delay > 0:
+                    time.sleep(delay)
+            # 与real_time_analysis相同的每条事件处理，只打分、不记录历史或发布事件
+            t0 = time.perf_counter()
+            data = dict(record)
+            data["timestamp"] = datetime.now().isoformat()
+            buffer.append(data)
+            if len(buffer) >= self.window:
+                w = i // self.window
+                analysis = self.agent._analyze_frame(pd.DataFrame(buffer), score)
+                buffer = []
+                self.agent._build_real_time_suggestions(analysis)
+                avg_completion_time[w] = analysis["average_completion_time"]
+                success_rate[w] = analysis["success_rate"]
+                anomaly_counts[w] = len(analysis["anomalies"])
+                window_latency[w] = time.perf_counter() - t0
+            event_latency[i] = time.perf_counter() - t0
+
+        hard_share = self._hard_cluster_share(features[:used], n_windows)
+        return {
+            "events": int(len(features)),
+            "windows": int(n_windows),
+            "pending_events": int(len(features) - used),
+            "elapsed_seconds": time.perf_counter() - started,
+            "latency_ms": self._latency_summary(event_latency * 1000),
+            "window_latency_ms": self._latency_summary(window_latency * 1000),
+            "event_latency_ms": (event_latency * 1000).tolist(),
+            "threshold_sets": {
+                name: self._evaluate(thresholds, {
+                    "success_rate": success_rate,
+                    "average_completion_time": avg_completion_time,
+                    "completion_rate": success_rate,
+                    "hard_cluster_share": hard_share,
+                }, anomaly_counts)
+                for name, thresholds in self.threshold_sets.items()
+            }
+        }
+
+    def _replay_offsets(self, df: pd.DataFrame, used: int) -> Optional[np.ndarray]:
+        """按倍速换算每条事件相对回放开始的时间偏移（秒）"""
+        if not self.speed or "timestamp" not in df.columns or used == 0:
+            return None
+        ts = pd.to_datetime(df["timestamp"].iloc[:used]).astype("int64").to_numpy() / 1e9
+        return (ts - ts[0]) / self.speed
+
+    def _scorer(self, features: np.ndarray):
+        """只打分的异常检测函数，回放数据不进入训练缓冲区，也不会触发重训练"""
+        models = self.agent.models
+        if models.ready:
+            return models.score
+        scaler = StandardScaler().fit(features)
+        forest = IsolationForest(contamination=models.contamination).fit(scaler.transform(features))
+        return lambda batch: forest.predict(scaler.transform(batch))
+
+    def _hard_cluster_share(self, features: np.ndarray, n_windows: int) -> np.ndarray:
+        """每个窗口落在最难聚类中的比例，整批回放数据一次划分（不修改线上模型）"""
+        if n_windows == 0:
+            return np.zeros(0, dtype=np.float64)
+        labels = self.agent.models.cluster(features[:, :2], bootstrap=False)
+        hardest = hardest_cluster(labels, features[:, 0])
+        return (labels == hardest).reshape(n_windows, self.window).mean(axis=1)
+
+    def _evaluate(self, thresholds: Dict[str, float], metrics: Dict[str, np.ndarray],
+                  anomaly_counts: np.ndarray) -> Dict[str, Any]:
+        """按智能体的规则表逐窗口向量化评估；整体调整规则把每个窗口视为一批玩家数据"""
+        thresholds = {**DEFAULT_THRESHOLDS, **thresholds}
+        real_time = {**evaluate_rules(REAL_TIME_RULES, metrics, thresholds), ANOMALY_RULE: anomaly_counts > 0}
+        adjustments = evaluate_rules(ADJUSTMENT_RULES, metrics, thresholds)
+        n_windows = max(len(anomaly_counts), 1)
+        any_suggestion = (np.logical_or.reduce(list(real_time.values())) if len(anomaly_counts)
+                          else np.zeros(0, bool))
+        any_adjustment = (np.logical_or.reduce(list(adjustments.values())) if len(anomaly_counts)
+                          else np.zeros(0, bool))
+        return {
+            "thresholds": thresholds,
+            "suggestion_windows": int(any_suggestion.sum()),
+            "suggestion_rate": float(any_suggestion.sum() / n_windows),
+            "adjustment_windows": int(any_adjustment.sum()),
+            "adjustment_rate": float(any_adjustment.sum() / n_windows),
+            "rule_counts": {rule: int(np.sum(hits)) for rule, hits in {**real_time, **adjustments}.items()},
+        }
+
+    @staticmethod
+    def _latency_summary(latency_ms: np.ndarray) -> Dict[str, float]:
+        if len(latency_ms) == 0:
+            return {"mean": 0.0, "p50": 0.0, "p95": 0.0, "max": 0.0}
+        return {
+            "mean": float(latency_ms.mean()),
+            "p50": float(np.percentile(latency_ms, 50)),
+            "p95": float(np.percentile(latency_ms, 95)),
+            "max": float(latency_ms.max()),
+        }
@@ -1,11 +1,18 @@
-from typing import Dict, Any
+from typing import Dict, Any, Iterator, Optional
 from ..core.base_agent import BaseAgent
+from .content_schema import schema_prompt, parse_records, StructuredContentStore
+from ..core.event_bus import BALANCE_SUGGESTION, ContentRecord
+from ..core.memory_budget import deep_size
 import os
 import requests
 import json
 import time
+import hashlib
+import threading
 import dashscope
 from http import HTTPStatus
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 
 class ContentGeneratorAgent(BaseAgent):
     def __init__(self, agent_id: str, controller):
@@ -21,6 +28,27 @@ class ContentGeneratorAgent(BaseAgent):
             "Content-Type": "application/json", 
             "Authorization": f"Bearer {self.deepseek_key}"
         }
+        self.structured_store = StructuredContentStore("data/generated_content.jsonl")
+        self.section_cache = OrderedDict()  # 分段生成的故事大纲和章节缓存
+        self.section_cache_size = 256
+        self.max_parallel_sections = 4  # 并行展开章节的最大线程数，避免章节多时同时发出过多API请求
+        self._cache_lock = threading.Lock()
+        # 平衡智能体发布的最新调整建议，生成游戏元素时参考
+        self.balance_feedback = None
+        self.balance_subscription = self.subscribe(BALANCE_SUGGESTION, self._on_balance_suggestion, max_queue=64)
+        
+    def _on_balance_suggestion(self, events):
+        self.balance_feedback = events[-1]
+        
+    def _balance_prompt(self) -> str:
+        feedback = self.balance_feedback
+        if feedback is None:
+            return ""
+        rate = f"（成功率{feedback.success_rate:.0%}）" if feedback.success_rate is not None else ""
+        return f"\n\n当前玩家数据反馈{rate}：{'；'.join(feedback.suggestions)}。请据此调整元素的数值平衡。"
+        
+    def memory_usage(self) -> Dict[str, int]:
+        return {"section_cache": deep_size(self.section_cache)}
         
     def process_task(self):
         """处理游戏内容生成任务"""
@@ -82,21 +110,36 @@ class ContentGeneratorAgent(BaseAgent):
 请生成详细角色设定，每个角色至少包含200字描述"""
             }]
             
+            if self.current_task.get("structured"):
+                messages[0]["content"] += "\n" + schema_prompt("character")
+                return self._generate_structured(
+                    "characters", "character",
+                    self._stream_deepseek("characters", {
+                        "messages": messages,
+                        "temperature": 0.85,
+                        "max_tokens": 800 * count,
+                        "top_p": 0.9
+                    }),
+                    meta={"prompt": prompt, "character_type": character_type}
+                )
+            
             try:
                 print("调用DeepSeek API生成角色...")
-                data = {
-                    "model": "deepseek-chat",
-                    "messages": messages,
-                    "temperature": 0.85,
-                    "max_tokens": 800 * count,
-                    "top_p": 0.9
-                }
-                
-                response = requests.post(
-                    self.api_url,
-                    headers=self.headers,
-                    json=data
-                )
+                with self.controller.model_router.route("characters", len(prompt)) as call:
+                    data = {
+                        "model": call.model,
+                        "messages": messages,
+                        "temperature": 0.85,
+                        "max_tokens": 800 * count,
+                        "top_p": 0.9
+                    }
+                    
+                    response = requests.post(
+                        self.api_url,
+                        headers=self.headers,
+                        json=data
+                    )
+                    call.ok = response.status_code == HTTPStatus.OK
                 
                 if response.status_code != HTTPStatus.OK:
                     return {
@@ -165,24 +208,39 @@ class ContentGeneratorAgent(BaseAgent):
 元素类型：{element_type}
 生成数量：{count}个
 
-请生成详细的游戏元素设定"""
+请生成详细的游戏元素设定{self._balance_prompt()}"""
             }]
             
+            if self.current_task.get("structured"):
+                messages[0]["content"] += "\n" + schema_prompt(element_type)
+                return self._generate_structured(
+                    "elements", element_type,
+                    self._stream_deepseek("elements", {
+                        "messages": messages,
+                        "temperature": 0.8,
+                        "max_tokens": 600 * count,
+                        "top_p": 0.9
+                    }),
+                    meta={"prompt": prompt}
+                )
+            
             try:
                 print(f"调用DeepSeek API生成{element_type}...")
-                data = {
-                    "model": "deepseek-chat",
-                    "messages": messages,
-                    "temperature": 0.8,
-                    "max_tokens": 600 * count,
-                    "top_p": 0.9
-                }
-                
-                response = requests.post(
-                    self.api_url,
-                    headers=self.headers,
-                    json=data
-                )
+                with self.controller.model_router.route("elements", len(prompt)) as call:
+                    data = {
+                        "model": call.model,
+                        "messages": messages,
+                        "temperature": 0.8,
+                        "max_tokens": 600 * count,
+                        "top_p": 0.9
+                    }
+                    
+                    response = requests.post(
+                        self.api_url,
+                        headers=self.headers,
+                        json=data
+                    )
+                    call.ok = response.status_code == HTTPStatus.OK
                 
                 if response.status_code != HTTPStatus.OK:
                     return {"error": f"API调用失败: {response.text}", "status": "failed"}
@@ -243,6 +301,11 @@ class ContentGeneratorAgent(BaseAgent):
             if story_type == 'custom' and custom_type_desc:
                 story_desc = custom_type_desc
                 
+            if self.current_task.get("mode") == "pipeline":
+                return self.generate_storyline_pipeline(
+                    prompt, story_type, story_desc, background, chars_desc, branch_points
+                )
+                
             messages = [{
                 "role": "system",
                 "content": f"""你是一个专业的游戏故事生成器，擅长创作{story_desc}风格的故事情节。
@@ -272,17 +335,31 @@ class ContentGeneratorAgent(BaseAgent):
 5. 游戏化适配建议（如关卡设计、玩法机制等）"""
             }]
             
+            if self.current_task.get("structured"):
+                messages[0]["content"] += (
+                    "\n每个故事要素作为一个故事节点输出，node_type取值为"
+                    "world/character/main/side/adaptation，分支选项写入choices。\n"
+                    + schema_prompt("story_node")
+                )
+                return self._generate_structured(
+                    "story", "story_node",
+                    self._stream_qwen(messages, temperature=0.9, top_p=0.95, max_tokens=1200),
+                    meta={"prompt": prompt, "story_type": story_type}
+                )
+            
             try:
                 print("调用DashScope API生成故事...")
-                response = dashscope.Generation.call(
-                    model='qwen-max',
-                    messages=messages,
-                    temperature=0.9,
-                    top_p=0.95,
-                    max_tokens=1200,
-                    result_format='message',
-                    seed=int(time.time())
-                )
+                with self.controller.model_router.route("storyline", len(prompt)) as call:
+                    response = dashscope.Generation.call(
+                        model=call.model,
+                        messages=messages,
+                        temperature=0.9,
+                        top_p=0.95,
+                        max_tokens=1200,
+                        result_format='message',
+                        seed=int(time.time())
+                    )
+                    call.ok = response.status_code == HTTPStatus.OK
                 
                 print(f"API响应状态码: {response.status_code}")
                 print(f"API响应内容: {response}")
@@ -326,3 +403,215 @@ class ContentGeneratorAgent(BaseAgent):
                 "error": str(e),
                 "status": "failed"
             }
+
+    def _stream_deepseek(self, route: str, data: Dict[str, Any]) -> Iterator[str]:
+        """以SSE流式调用DeepSeek API，逐块返回增量文本，模型由路由策略选择"""
+        print("流式调用DeepSeek API...")
+        with self.controller.model_router.route(route, len(str(self.current_task.get("prompt", "")))) as call:
+            response = requests.post(
+                self.api_url,
+                headers=self.headers,
+                json={**data, "model": call.model, "stream": True},
+                stream=True
+            )
+            if response.status_code != HTTPStatus.OK:
+                raise RuntimeError(f"API调用失败: {response.text}")
+                
+            for line in response.iter_lines(decode_unicode=True):
+                if not line or not line.startswith("data:"):
+                    continue
+                payload = line[len("data:"):].strip()
+                if payload == "[DONE]":
+                    break
+                chunk = json.loads(payload)
+                delta = chunk["choices"][0].get("delta", {}).get("content")
+                if delta:
+                    yield delta
+
+    def _stream_qwen(self, messages, route: str = "storyline", **params) -> Iterator[str]:
+        """流式调用DashScope API，逐块返回增量文本，模型由路由策略选择"""
+        print("流式调用DashScope API...")
+        dashscope.api_key = self.dashscope_key
+        with self.controller.model_router.route(route, len(str(self.current_task.get("prompt", "")))) as call:
+            responses = dashscope.Generation.call(
+                model=call.model,
+                messages=messages,
+                result_format='message',
+                stream=True,
+                incremental_output=True,
+                seed=int(time.time()),
+                **params
+            )
+            for response in responses:
+                if response.status_code != HTTPStatus.OK:
+                    raise RuntimeError(f"API调用失败: {response.message}")
+                delta = response.output.choices[0].message.content
+                if delta:
+                    yield delta
+
+    def _generate_structured(self, result_key: str, kind: str, chunks: Iterator[str],
+                             meta: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """边接收边解析结构化输出，每条记录校验后立即发布到事件总线，全部完成后写入紧凑存储"""
+        task_id = self.current_task.get("task_id")
+
+        def on_record(record):
+            self.controller.event_bus.publish(ContentRecord(
+                source=self.agent_id, task_id=task_id, kind=kind, record=record
+            ))
+
+        try:
+            parsed = parse_records(kind, chunks, on_record=on_record)
+        except Exception as e:
+            return {"error": str(e), "status": "failed"}
+            
+        records = parsed["records"]
+        if not records:
+            return {
+                "error": "未解析到有效的结构化内容",
+                "details": parsed["errors"],
+                "status": "failed"
+            }
+            
+        try:
+            self.structured_store.append(kind, records, meta)
+        except Exception as e:
+            print(f"保存结构化内容失败: {e}")
+            
+        result = {
+            result_key: records,
+            "count": len(records),
+            "format": "structured",
+            "status": "completed"
+        }
+        if parsed["errors"]:
+            result["warnings"] = parsed["errors"]
+        return result
+
+    def _call_qwen(self, messages, max_tokens: int, temperature: float = 0.9,
+                   route: str = "story_section") -> str:
+        """按路由策略选择通义千问模型调用并返回文本内容，失败时抛出异常"""
+        dashscope.api_key = self.dashscope_key
+        with self.controller.model_router.route(route, len(messages[-1]["content"])) as call:
+            response = dashscope.Generation.call(
+                model=call.model,
+                messages=messages,
+                temperature=temperature,
+                top_p=0.95,
+                max_tokens=max_tokens,
+                result_format='message',
+                seed=int(time.time())
+            )
+            call.ok = response.status_code == HTTPStatus.OK
+        if response.status_code != HTTPStatus.OK:
+            raise RuntimeError(f"API调用失败: {response.message}")
+        content = response.output.choices[0].message.content
+        if not content or not content.strip():
+            raise RuntimeError("API返回空内容")
+        return content
+
+    def _cached_generate(self, key_parts, generate, refresh: bool = False) -> str:
+        """按输入内容哈希缓存生成结果"""
+        key = hashlib.sha1(
+            json.dumps(key_parts, ensure_ascii=False, sort_keys=True).encode("utf-8")
+        ).hexdigest()
+        with self._cache_lock:
+            if not refresh and key in self.section_cache:
+                self.section_cache.move_to_end(key)
+                return self.section_cache[key]
+            
+        content = generate()
+        with self._cache_lock:
+            self.section_cache[key] = content
+            while len(self.section_cache) > self.section_cache_size:
+                self.section_cache.popitem(last=False)
+        return content
+
+    def generate_storyline_pipeline(self, prompt: str, story_type: str, story_desc: str,
+                                    background: str, chars_desc: str,
+                                    branch_points) -> Dict[str, Any]:
+        """先生成大纲，再并行展开各章节和分支点，最后合并为完整故事"""
+        started = time.time()
+        refresh = bool(self.current_task.get("refresh"))
+        system_prompt = f"你是一个专业的游戏故事生成器，擅长创作{story_desc}风格的故事情节。"
+        context = f"""主题：{prompt}
+故事类型：{story_type}
+{'' if not background else '背景设定：' + background}
+{chars_desc}"""
+        
+        try:
+            print("调用DashScope API生成故事大纲...")
+            outline = self._cached_generate(
+                ["outline", prompt, story_desc, background, chars_desc, branch_points],
+                lambda: self._call_qwen([{
+                    "role": "system",
+                    "content": system_prompt
+                }, {
+                    "role": "user",
+                    "content": f"""{context}
+
+请先生成故事大纲（不超过400字），依次概括：世界观、3-5个主要角色、主线的3-5个关键情节点、2-3条支线任务、游戏化适配方向，以及各分支点在主线中的位置。"""
+                }], max_tokens=600, route="storyline"),
+                refresh
+            )
+        except Exception as e:
+            print(f"故事大纲生成失败: {str(e)}")
+            return {"error": str(e), "status": "failed"}
+            
+        sections = [
+            ("world", "世界观设定", "世界观设定（200-300字，包含地理、历史、文化）"),
+            ("characters", "主要角色", "主要角色（3-5个，每个角色包含背景故事、性格特点、角色成长弧线），已有角色设定必须保留"),
+            ("main_plot", "主线剧情", "主线剧情（包含3-5个关键情节点和至少3个关键转折）"),
+            ("side_quests", "支线任务", "支线任务设计（2-3个，包含任务目标和奖励）"),
+            ("adaptation", "游戏化适配建议", "游戏化适配建议（关卡设计、玩法机制、奖励系统）"),
+        ]
+        for i, branch in enumerate(branch_points or []):
+            sections.append((f"branch_{i + 1}", f"分支点：{branch}", f"分支剧情：围绕分支点“{branch}”展开玩家的不同选择及其后果，至少包含2种结局"))
+            
+        def expand(section):
+            key, _, instruction = section
+            return self._cached_generate(
+                ["section", outline, chars_desc, key, instruction],
+                lambda: self._call_qwen([{
+                    "role": "system",
+                    "content": system_prompt + "请严格遵循给定的故事大纲，只撰写要求的部分，保证与大纲和其他部分一致。"
+                }, {
+                    "role": "user",
+                    "content": f"""{context}
+
+故事大纲：
+{outline}
+
+请撰写：{instruction}"""
+                }], max_tokens=800),
+                refresh
+            )
+            
+        # 各章节并行生成（最多max_parallel_sections个同时进行），总延迟取决于最慢的章节
+        print(f"并行展开{len(sections)}个故事章节...")
+        results, failed = {}, {}
+        with ThreadPoolExecutor(max_workers=max(1, min(len(sections), self.max_parallel_sections))) as executor:
+            futures = {section[0]: executor.submit(expand, section) for section in sections}
+            for key, future in futures.items():
+                try:
+                    results[key] = future.result()
+                except Exception as e:
+                    failed[key] = str(e)
+                    
+        if not results:
+            return {"error": "所有章节生成失败", "failed_sections": failed, "status": "failed"}
+            
+        parts = [f"# 故事大纲\n{outline.strip()}"]
+        for key, title, _ in sections:
+            parts.append(f"## {title}\n{results.get(key, '（该部分生成失败）').strip()}")
+            
+        result = {
+            "story": "\n\n".join(parts),
+            "outline": outline,
+            "sections": results,
+            "mode": "pipeline",
+            "elapsed": round(time.time() - started, 2),
+            "status": "completed"
+        }
+        if failed:
+            result["failed_sections"] = failed
+        return result
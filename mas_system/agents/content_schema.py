@@ -0,0 +1,239 @@
+from typing import Dict, Any, List, Optional, Iterator
+from dataclasses import dataclass, field, fields, asdict, MISSING
+import os
+import json
+import uuid
+
+# 结构化内容生成的数据模式、流式增量解析和紧凑存储
+
+@dataclass
+class CharacterSchema:
+    name: str
+    appearance: str
+    background: str
+    personality: str
+    motivation: str
+    relationships: str = ""
+    growth: str = ""
+    role: str = ""
+
+@dataclass
+class ItemSchema:
+    name: str
+    description: str
+    effect: str
+    rarity: str = "common"
+
+@dataclass
+class SkillSchema:
+    name: str
+    description: str
+    effect: str
+    cooldown: float = 0.0
+    cost: float = 0.0
+
+@dataclass
+class QuestSchema:
+    name: str
+    description: str
+    objectives: List[str] = field(default_factory=list)
+    rewards: List[str] = field(default_factory=list)
+
+@dataclass
+class StoryNodeSchema:
+    node_id: str
+    title: str
+    content: str
+    node_type: str = "main"  # world/character/main/side/adaptation
+    choices: List[str] = field(default_factory=list)
+
+SCHEMAS = {
+    "character": CharacterSchema,
+    "item": ItemSchema,
+    "skill": SkillSchema,
+    "quest": QuestSchema,
+    "story_node": StoryNodeSchema,
+}
+
+_TYPE_NAMES = {str: "string", float: "number", List[str]: "string[]"}
+
+def schema_prompt(kind: str) -> str:
+    """生成要求模型输出JSON数组的提示说明"""
+    if kind not in SCHEMAS:
+        raise ValueError(f"不支持的结构类型: {kind}")
+    spec = ", ".join(
+        f'"{f.name}": {_TYPE_NAMES.get(f.type, "string")}'
+        for f in fields(SCHEMAS[kind])
+    )
+    return (
+        "只输出一个JSON数组，不要输出任何其他文字或Markdown代码块。"
+        f"数组中每个元素是一个对象，字段为：{{{spec}}}"
+    )
+
+def validate_record(kind: str, obj: Any) -> Dict[str, Any]:
+    """按模式校验并规范化单条记录，不合法时抛出ValueError"""
+    if kind not in SCHEMAS:
+        raise ValueError(f"不支持的结构类型: {kind}")
+    if not isinstance(obj, dict):
+        raise ValueError(f"{kind}记录必须是JSON对象")
+
+    values = {}
+    for f in fields(SCHEMAS[kind]):
+        required = f.default is MISSING and f.default_factory is MISSING
+        if f.name not in obj or obj[f.name] is None:
+            if required:
+                raise ValueError(f"{kind}记录缺少字段: {f.name}")
+            continue
+
+        value = obj[f.name]
+        if f.type is str:
+            if isinstance(value, (dict, list)):
+                value = json.dumps(value, ensure_ascii=False)
+            values[f.name] = str(value).strip()
+        elif f.type is float:
+            try:
+                values[f.name] = float(value)
+            except (TypeError, ValueError):
+                raise ValueError(f"{kind}字段{f.name}必须是数字")
+        else:
+            if isinstance(value, str):
+                value = [value]
+            if not isinstance(value, list):
+                raise ValueError(f"{kind}字段{f.name}必须是数组")
+            values[f.name] = [str(v) for v in value]
+
+    return asdict(SCHEMAS[kind](**values))
+
+class IncrementalJSONParser:
+    """流式增量解析器：逐块输入文本，返回已完整闭合的顶层JSON对象"""
+
+    def __init__(self):
+        self._buffer = []
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+
+    def feed(self, chunk: str) -> List[Dict[str, Any]]:
+        objects = []
+        for ch in chunk:
+            if self._depth == 0:
+                # 跳过数组括号、逗号、代码块标记等对象之外的内容
+                if ch == "{":
+                    self._depth = 1
+                    self._buffer = [ch]
+                continue
+
+            self._buffer.append(ch)
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == '"':
+                self._in_string = True
+            elif ch == "{":
+                self._depth += 1
+            elif ch == "}":
+                self._depth -= 1
+                if self._depth == 0:
+                    text = "".join(self._buffer)
+                    self._buffer = []
+                    try:
+                        objects.append(json.loads(text))
+                    except json.JSONDecodeError as e:
+                        print(f"跳过无法解析的JSON片段: {e}")
+        return objects
+
+    @property
+    def pending(self) -> bool:
+        """是否还有未闭合的对象"""
+        return self._depth > 0
+
+def parse_records(kind: str, chunks, on_record=None) -> Dict[str, Any]:
+    """解析流式文本块并逐条校验，返回记录列表和被丢弃的错误"""
+    parser = IncrementalJSONParser()
+    records, errors = [], []
+    for chunk in chunks:
+        for obj in parser.feed(chunk):
+            try:
+                record = validate_record(kind, obj)
+            except ValueError as e:
+                errors.append(str(e))
+                continue
+            records.append(record)
+            if on_record:
+                on_record(record)
+    if parser.pending:
+        errors.append("输出被截断，最后一条记录不完整")
+    return {"records": records, "errors": errors}
+
+BATCH_KIND = "_batch"
+
+class StructuredContentStore:
+    """以JSONL紧凑存储结构化内容，每行一条记录，可按字段直接查询
+
+    同一次生成的公共信息（如prompt）只在批次行中写一次，记录行通过batch字段引用。
+    """
+
+    def __init__(self, path: str = "data/generated_content.jsonl"):
+        self.path = path
+
+    def append(self, kind: str, records: List[Dict[str, Any]],
+               meta: Optional[Dict[str, Any]] = None) -> Optional[str]:
+        """追加记录，meta写入一条批次行，返回批次ID（无meta时为None）"""
+        if not records:
+            return None
+        batch_id = uuid.uuid4().hex[:12] if meta else None
+        lines = []
+        if batch_id:
+            lines.append({"kind": BATCH_KIND, "batch_id": batch_id, "record_kind": kind, **meta})
+        for record in records:
+            lines.append({"kind": kind, **({"batch": batch_id} if batch_id else {}), **record})
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(self.path, "a", encoding="utf-8") as f:
+            for row in lines:
+                f.write(json.dumps(row, ensure_ascii=False, separators=(",", ":")) + "\n")
+        return batch_id
+
+    def iter_records(self, kind: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        """按类型遍历记录行（不含批次行）"""
+        for row in self._iter_rows():
+            if row.get("kind") != BATCH_KIND and (kind is None or row.get("kind") == kind):
+                yield row
+
+    def batches(self) -> Dict[str, Dict[str, Any]]:
+        """返回{批次ID: meta}"""
+        return {
+            row["batch_id"]: {k: v for k, v in row.items() if k not in ("kind", "batch_id")}
+            for row in self._iter_rows() if row.get("kind") == BATCH_KIND
+        }
+
+    def _iter_rows(self) -> Iterator[Dict[str, Any]]:
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                yield json.loads(line)
+
+    def query(self, kind: Optional[str] = None, columns: Optional[List[str]] = None,
+              **filters) -> List[Dict[str, Any]]:
+        """按类型和字段等值过滤，可只取部分列；记录中没有的字段从所属批次的meta中查找"""
+        batches = self.batches() if filters or columns else {}
+        results = []
+        for row in self.iter_records(kind):
+            meta = batches.get(row.get("batch"), {})
+            if all(row.get(k, meta.get(k)) == v for k, v in filters.items()):
+                results.append({c: row.get(c, meta.get(c)) for c in columns} if columns else row)
+        return results
+
+    def to_columns(self, kind: str) -> Dict[str, List[Any]]:
+        """按列返回某一类型的全部记录，便于直接构造DataFrame"""
+        columns: Dict[str, List[Any]] = {}
+        rows = list(self.iter_records(kind))
+        for key in dict.fromkeys(k for row in rows for k in row):  # 按首次出现的顺序
+            columns[key] = [row.get(key) for row in rows]
+        return columns
@@ -0,0 +1,263 @@
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import os
+import re
+import json
+import zlib
+import numpy as np
+
+_PRIME = np.uint64(4294967291)  # 小于2^32的最大素数
+_PUNCTUATION = re.compile(r"[\s\W_]+", re.UNICODE)
+# 对场景判断无意义的交互用语，计算相似度前去除；中文没有词边界，单字虚词（如“中”“和”）
+# 会被从“中心”“和平”等实词里误删，因此只收录多字短语
+DEFAULT_STOPWORDS = ("npc", "说话", "对话", "交谈", "聊天", "请问")
+
+class SemanticDialogueCache:
+    """基于字符n-gram MinHash + LSH的近似重复对话缓存
+
+    相似的玩家输入（如“酒馆里的酒保”与“NPC是酒馆里的酒保”）会命中同一条
+    缓存，复用已生成的NPC回应。签名和LSH分桶都存放在定长numpy数组中，内存随
+    capacity线性且有上限，满时按最近使用时间批量淘汰。
+    """
+
+    def __init__(self, capacity: int = 100000, num_perm: int = 32, bands: int = 8,
+                 threshold: float = 0.5, ngram: int = 2, max_variants: int = 3,
+                 max_candidates: int = 64, seed: int = 42,
+                 stopwords: Iterable[str] = DEFAULT_STOPWORDS):
+        if num_perm % bands != 0:
+            raise ValueError("num_perm必须能被bands整除")
+        self.capacity = capacity
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.threshold = threshold              # 估计Jaccard相似度达到此值才复用
+        self.ngram = ngram
+        self.max_variants = max_variants        # 每条输入最多保留的不同回应数
+        self.max_candidates = max_candidates    # 每个分桶最多比较的候选数
+        self.seed = seed
+        self.stopwords = tuple(stopwords)
+
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(1, 2 ** 31, size=num_perm, dtype=np.uint64)
+        self._b = rng.integers(0, int(_PRIME), size=num_perm, dtype=np.uint64)
+        self._band_mix = rng.integers(1, 2 ** 63, size=self.rows, dtype=np.uint64)
+
+        self.signatures = np.zeros((capacity, num_perm), dtype=np.uint32)
+        self.band_keys = np.zeros((capacity, bands), dtype=np.uint64)
+        self.last_used = np.full(capacity, -1, dtype=np.int64)  # -1表示空槽
+        self.inputs: List[Optional[str]] = [None] * capacity
+        self.responses: List[Optional[List[Any]]] = [None] * capacity
+        self._free = list(range(capacity - 1, -1, -1))
+        self._clock = 0
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0, "skipped": 0}
+
+        # 已排序的主索引 + 增量字典，增量过大时合并重建
+        self._sorted_keys: List[np.ndarray] = [np.zeros(0, np.uint64)] * bands
+        self._sorted_slots: List[np.ndarray] = [np.zeros(0, np.int64)] * bands
+        self._delta: List[Dict[int, List[int]]] = [{} for _ in range(bands)]
+        self._delta_size = 0
+        self.rebuild_every = 4096
+
+    def __len__(self) -> int:
+        return self.capacity - len(self._free)
+
+    def _normalize(self, text: str) -> str:
+        text = _PUNCTUATION.sub("", text.lower())
+        for word in self.stopwords:
+            text = text.replace(word, "")
+        return text
+
+    def cacheable(self, text: str) -> bool:
+        """去除标点和交互用语后不足一个n-gram的输入（如“？”“NPC说话”）没有可比较的内容，不参与缓存"""
+        return len(self._normalize(text)) >= self.ngram
+
+    def _shingles(self, text: str) -> np.ndarray:
+        text = self._normalize(text)
+        if len(text) <= self.ngram:
+            grams = {text}
+        else:
+            grams = {text[i:i + self.ngram] for i in range(len(text) - self.ngram + 1)}
+        return np.fromiter(
+            (zlib.crc32(g.encode("utf-8")) for g in grams), dtype=np.uint64, count=len(grams)
+        )
+
+    def signature(self, text: str) -> np.ndarray:
+        """计算MinHash签名"""
+        hashes = self._shingles(text)
+        return ((hashes[:, None] * self._a + self._b) % _PRIME).min(axis=0).astype(np.uint32)
+
+    def _band_keys(self, sig: np.ndarray) -> np.ndarray:
+        rows = sig.reshape(-1, self.bands, self.rows).astype(np.uint64)
+        return (rows * self._band_mix).sum(axis=-1).reshape(sig.shape[:-1] + (self.bands,))
+
+    def _search(self, sig: np.ndarray) -> Tuple[int, float]:
+        """返回最相似的槽位及其估计相似度，无候选时返回(-1, 0.0)"""
+        keys = self._band_keys(sig)
+        candidates = set()
+        for band in range(self.bands):
+            key = keys[band]
+            sorted_keys = self._sorted_keys[band]
+            lo = np.searchsorted(sorted_keys, key, side="left")
+            hi = min(np.searchsorted(sorted_keys, key, side="right"), lo + self.max_candidates)
+            candidates.update(self._sorted_slots[band][lo:hi].tolist())
+            candidates.update(self._delta[band].get(int(key), ())[:self.max_candidates])
+        if not candidates:
+            return -1, 0.0
+
+        slots = np.fromiter(candidates, dtype=np.int64, count=len(candidates))
+        # 过滤已淘汰或被复用的槽位
+        valid = (self.last_used[slots] >= 0) & (self.band_keys[slots] == keys).any(axis=1)
+        slots = slots[valid]
+        if len(slots) == 0:
+            return -1, 0.0
+        similarity = (self.signatures[slots] == sig).mean(axis=1)
+        best = int(np.argmax(similarity))
+        return int(slots[best]), float(similarity[best])
+
+    def lookup(self, text: str) -> Optional[Dict[str, Any]]:
+        """查找相似输入，命中时轮换返回已存的回应"""
+        if not self.cacheable(text):
+            self.stats["skipped"] += 1
+            return None
+        slot, similarity = self._search(self.signature(text))
+        if slot < 0 or similarity < self.threshold:
+            self.stats["misses"] += 1
+            return None
+        self.stats["hits"] += 1
+        self._touch(slot)
+        variants = self.responses[slot]
+        response = variants[0]
+        variants.append(variants.pop(0))
+        return {
+            "response": response,
+            "similarity": similarity,
+            "matched_input": self.inputs[slot]
+        }
+
+    def add(self, text: str, response: Any, dedupe: bool = True):
+        """写入一对输入和回应；近似重复的输入合并为同一条的不同回应"""
+        if not self.cacheable(text):
+            self.stats["skipped"] += 1
+            return
+        sig = self.signature(text)
+        if dedupe:
+            slot, similarity = self._search(sig)
+            if slot >= 0 and similarity >= self.threshold:
+                variants = self.responses[slot]
+                if response not in variants:
+                    variants.append(response)
+                    del variants[:-self.max_variants]
+                self._touch(slot)
+                return
+        self._insert(text, sig, [response])
+
+    def add_many(self, pairs: Iterable[Tuple[str, Any]]):
+        """批量写入（不去重），结束后统一重建索引"""
+        rebuild_every, self.rebuild_every = self.rebuild_every, float("inf")
+        try:
+            for text, response in pairs:
+                if not self.cacheable(text):
+                    continue
+                self._insert(text, self.signature(text), [response])
+        finally:
+            self.rebuild_every = rebuild_every
+        self._rebuild_index()
+
+    def clear(self):
+        self.last_used[:] = -1
+        self.inputs = [None] * self.capacity
+        self.responses = [None] * self.capacity
+        self._free = list(range(self.capacity - 1, -1, -1))
+        self._rebuild_index()
+
+    def _touch(self, slot: int):
+        self._clock += 1
+        self.last_used[slot] = self._clock
+
+    def _insert(self, text: str, sig: np.ndarray, variants: List[Any], last_used: Optional[int] = None):
+        if not self._free:
+            self._evict(max(1, self.capacity // 100))
+        slot = self._free.pop()
+        self.signatures[slot] = sig
+        self.band_keys[slot] = self._band_keys(sig)
+        self.inputs[slot] = text
+        self.responses[slot] = variants
+        if last_used is None:
+            self._touch(slot)
+        else:
+            self.last_used[slot] = last_used
+            self._clock = max(self._clock, last_used)
+
+        for band in range(self.bands):
+            self._delta[band].setdefault(int(self.band_keys[slot, band]), []).append(slot)
+        self._delta_size += 1
+        if self._delta_size >= self.rebuild_every:
+            self._rebuild_index()
+
+    def _evict(self, count: int):
+        """淘汰最久未使用的一批槽位"""
+        occupied = np.flatnonzero(self.last_used >= 0)
+        count = min(count, len(occupied))
+        oldest = occupied[np.argpartition(self.last_used[occupied], count - 1)[:count]]
+        for slot in oldest.tolist():
+            self.last_used[slot] = -1
+            self.inputs[slot] = None
+            self.responses[slot] = None
+            self._free.append(slot)
+        self.stats["evictions"] += count
+
+    def _rebuild_index(self):
+        occupied = np.flatnonzero(self.last_used >= 0)
+        for band in range(self.bands):
+            keys = self.band_keys[occupied, band]
+            order = np.argsort(keys, kind="stable")
+            self._sorted_keys[band] = keys[order]
+            self._sorted_slots[band] = occupied[order]
+            self._delta[band] = {}
+        self._delta_size = 0
+
+    def _config(self) -> List[int]:
+        """影响签名的参数，加载时不一致则索引失效"""
+        stopwords = zlib.crc32("\x00".join(self.stopwords).encode("utf-8"))
+        return [self.num_perm, self.bands, self.ngram, self.seed, stopwords]
+
+    def save(self, directory: str):
+        """保存到目录：signatures.npz存签名和使用时间，entries.jsonl存文本"""
+        os.makedirs(directory, exist_ok=True)
+        occupied = np.flatnonzero(self.last_used >= 0)
+        np.savez(
+            os.path.join(directory, "signatures.npz"),
+            signatures=self.signatures[occupied],
+            last_used=self.last_used[occupied],
+            config=np.array(self._config())
+        )
+        with open(os.path.join(directory, "entries.jsonl"), "w", encoding="utf-8") as f:
+            for slot in occupied.tolist():
+                f.write(json.dumps([self.inputs[slot], self.responses[slot]], ensure_ascii=False) + "\n")
+
+    def load(self, directory: str) -> bool:
+        """从目录加载，参数不一致或文件不存在时返回False"""
+        sig_path = os.path.join(directory, "signatures.npz")
+        entries_path = os.path.join(directory, "entries.jsonl")
+        if not (os.path.exists(sig_path) and os.path.exists(entries_path)):
+            return False
+        data = np.load(sig_path)
+        if data["config"].tolist() != self._config():
+            print("语义缓存参数不一致，忽略已保存的索引")
+            return False
+
+        self.clear()
+        with open(entries_path, "r", encoding="utf-8") as f:
+            entries = [json.loads(line) for line in f if line.strip()]
+        # 超出容量时只保留最近使用的条目
+        order = np.argsort(data["last_used"])[-self.capacity:]
+        rebuild_every, self.rebuild_every = self.rebuild_every, float("inf")
+        try:
+            for i in order.tolist():
+                text, variants = entries[i]
+                if not self.cacheable(text):
+                    continue
+                self._insert(text, data["signatures"][i], variants, int(data["last_used"][i]))
+        finally:
+            self.rebuild_every = rebuild_every
+        self._rebuild_index()
+        return True
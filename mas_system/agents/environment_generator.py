@@ -1,6 +1,14 @@
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional
 from datetime import datetime, timedelta
 from ..core.base_agent import BaseAgent
+from ..core.warm_pool import WarmPool
+from .procedural_scene import ProceduralSceneRenderer
+from .world_chunks import WorldChunk, ChunkStore, world_noise
+from ..core.shared_state import SharedStateBlock
+from ..core.event_bus import WeatherChanged
+from ..core.memory_budget import deep_size
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
 from PIL import Image
 import cv2
@@ -12,6 +20,7 @@ import traceback
 import requests
 from pathlib import Path
 import uuid
+import threading
 
 class EnvironmentGeneratorAgent(BaseAgent):
     def __init__(self, agent_id: str, controller):
@@ -22,6 +31,29 @@ class EnvironmentGeneratorAgent(BaseAgent):
         self.weather_states = ["sunny", "rainy", "cloudy", "foggy", "stormy"]
         self.current_weather = "sunny"
         self.time_of_day = datetime.now().strftime("%H:%M")
+        # 高频场景图的预生成池，调用scene_pool.start()开启后台预生成
+        self.scene_pool = WarmPool(
+            generator=self._pregenerate_scene,
+            variants_per_key=2,
+            budget=20,
+            idle_check=lambda: self.controller.get_agent_status(self.agent_id) == "idle",
+            max_keys=self.controller.memory_budget.warm_pool_keys
+        )
+        # 本地程序化预览：先返回预览图，高清图在后台生成；API失败时作为离线回退
+        self.preview_renderer = ProceduralSceneRenderer()
+        self.offline_fallback = True
+        self.scene_jobs: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()  # 超出上限时淘汰最早完成的结果
+        self._hq_executor = ThreadPoolExecutor(max_workers=2)
+        # 分块开放世界：按区块坐标懒生成场景和天气，已加载区块有界，淘汰的写入磁盘
+        self.world_seed = 20240501
+        self.chunk_size = 256        # 每个区块覆盖的世界坐标边长
+        self.chunk_resolution = 64   # 区块高度图分辨率
+        self.chunk_store = ChunkStore("data/world_chunks", max_loaded=64)
+        self.weather_period = 3600   # 区块天气的变化周期（秒），同一周期内相邻区块共享区域天气
+        self._chunk_executor = ThreadPoolExecutor(max_workers=2)
+        self._chunk_futures: Dict[tuple, Any] = {}
+        self._chunk_lock = threading.Lock()
+        self.shared_weather: Optional[SharedStateBlock] = None  # 跨进程共享的天气状态
         
     def process_task(self):
         """处理环境生成任务"""
@@ -34,6 +66,12 @@ class EnvironmentGeneratorAgent(BaseAgent):
             return self.generate_scene()
         elif task_type == "weather_system":
             return self.generate_weather()
+        elif task_type == "scene_result":
+            return self.get_scene_result()
+        elif task_type == "world_chunk":
+            return self.get_world_chunk()
+        elif task_type == "world_prefetch":
+            return self.prefetch_world_chunks()
         else:
             raise ValueError(f"未知任务类型: {task_type}")
             
@@ -41,6 +79,109 @@ class EnvironmentGeneratorAgent(BaseAgent):
         """从文本描述生成游戏场景"""
         scene_prompt = self.current_task["scene_prompt"]
         
+        pooled = self.scene_pool.get(scene_prompt)
+        if pooled:
+            return {
+                **pooled,
+                "key_elements": self._analyze_scene_elements(scene_prompt),
+                "from_pool": True
+            }
+            
+        if self.current_task.get("offline"):
+            return self._render_preview(scene_prompt)
+            
+        if self.current_task.get("preview"):
+            # 立即返回预览图，高清图完成后通过scene_result任务获取
+            result = self._render_preview(scene_prompt)
+            job_id = uuid.uuid4().hex
+            self.scene_jobs[job_id] = {"status": "pending"}
+            self._evict_scene_jobs()
+            self._hq_executor.submit(self._run_scene_job, job_id, scene_prompt)
+            result.update({"job_id": job_id, "hq_status": "pending"})
+            return result
+            
+        result = self._synthesize_scene(scene_prompt)
+        if result.get("status") == "failed" and self.offline_fallback:
+            fallback = self._render_preview(scene_prompt)
+            fallback.update({"fallback": True, "detail": result.get("detail")})
+            return fallback
+        return result
+        
+    def _render_preview(self, scene_prompt: str) -> Dict[str, Any]:
+        """用本地程序化生成器渲染场景预览图"""
+        elements = self._analyze_scene_elements(scene_prompt)
+        effects = self._get_weather_effects(elements["weather"])
+        try:
+            local_url = self.preview_renderer.render_to_file(
+                elements,
+                seed=self.preview_renderer.seed_for(scene_prompt),
+                light_intensity=effects.get("light_intensity", 1.0)
+            )
+        except Exception as e:
+            return {
+                "scene_description": scene_prompt,
+                "scene_image": None,
+                "status": "failed",
+                "detail": f"本地预览生成失败: {str(e)}"
+            }
+        return {
+            "scene_description": scene_prompt,
+            "scene_image": local_url,
+            "key_elements": elements,
+            "preview": True,
+            "status": "completed"
+        }
+        
+    def _run_scene_job(self, job_id: str, scene_prompt: str):
+        try:
+            self.scene_jobs[job_id] = self._synthesize_scene(scene_prompt)
+        except Exception as e:
+            self.scene_jobs[job_id] = {"status": "failed", "detail": str(e)}
+            
+    def _evict_scene_jobs(self):
+        excess = len(self.scene_jobs) - self.controller.memory_budget.scene_jobs
+        if excess <= 0:
+            return
+        finished = [job_id for job_id, job in list(self.scene_jobs.items()) if job.get("status") != "pending"]
+        for job_id in finished[:excess]:
+            self.scene_jobs.pop(job_id, None)
+            
+    def close(self):
+        self.scene_pool.stop()
+        self._hq_executor.shutdown(wait=False)
+        self._chunk_executor.shutdown(wait=False)
+        super().close()
+        
+    def memory_usage(self) -> Dict[str, int]:
+        return {
+            "scene_jobs": deep_size(self.scene_jobs),
+            "scene_pool": deep_size(self.scene_pool),
+            "loaded_chunks": sum(
+                np.asarray(chunk.heightmap).nbytes
+                for chunk in list(self.chunk_store.loaded.values())
+                if not isinstance(chunk.heightmap, np.memmap)
+            ),
+        }
+        
+    def get_scene_result(self) -> Dict[str, Any]:
+        """获取后台高清场景图的生成结果"""
+        job_id = self.current_task.get("job_id")
+        if job_id not in self.scene_jobs:
+            raise ValueError(f"未知的场景任务: {job_id}")
+        result = self.scene_jobs[job_id]
+        if result.get("status") != "pending":
+            del self.scene_jobs[job_id]
+        return result
+        
+    def _pregenerate_scene(self, scene_prompt: str) -> Optional[Dict[str, Any]]:
+        """为高频场景描述预生成一张场景图"""
+        result = self._synthesize_scene(scene_prompt)
+        if result.get("status") != "completed":
+            return None
+        return {k: v for k, v in result.items() if k != "key_elements"}
+        
+    def _synthesize_scene(self, scene_prompt: str) -> Dict[str, Any]:
+        """调用通义万相生成场景图并下载到本地"""
         # 使用Qwen-VL模型生成场景图
         try:
             dashscope.api_key = self.dashscope_key
@@ -203,6 +344,12 @@ class EnvironmentGeneratorAgent(BaseAgent):
         else:  # 夜晚
             effects["light_intensity"] *= 0.5
             
+        if self.shared_weather is not None:
+            self.shared_weather.write({"weather": weather_type, "time": self.time_of_day, "effects": effects})
+        self.controller.event_bus.publish(WeatherChanged(
+            source=self.agent_id, weather=weather_type, time_of_day=self.time_of_day, effects=effects
+        ))
+            
         return {
             "weather": weather_type,
             "time": self.time_of_day,
@@ -210,6 +357,18 @@ class EnvironmentGeneratorAgent(BaseAgent):
             "status": "completed"
         }
         
+    def enable_shared_weather(self, name: Optional[str] = None, path: Optional[str] = None) -> str:
+        """创建共享天气状态块，其他进程可用SharedStateBlock.attach(name).read()读取"""
+        if self.shared_weather is None:
+            self.shared_weather = SharedStateBlock.create(name=name, path=path)
+            self.shared_weather.write({
+                "weather": self.current_weather,
+                "time": self.time_of_day,
+                "effects": self._get_weather_effects(self.current_weather)
+            })
+            self.controller.register_shared_state(self.agent_id, "weather", self.shared_weather.name)
+        return self.shared_weather.name
+        
     def _analyze_scene(self, edges):
         """分析场景特征并生成描述"""
         # 简化实现 - 实际项目中使用更复杂的CV算法
@@ -225,3 +384,152 @@ class EnvironmentGeneratorAgent(BaseAgent):
             "stormy": {"light_intensity": 0.5, "particles": 800}
         }
         return effects.get(weather_type, {})
+
+        
+    def chunk_coords(self, x: float, y: float) -> tuple:
+        """世界坐标转换为区块坐标"""
+        return int(np.floor(x / self.chunk_size)), int(np.floor(y / self.chunk_size))
+        
+    def _generate_chunk(self, cx: int, cy: int) -> WorldChunk:
+        """生成单个区块的地形（天气在访问时由chunk_weather计算）"""
+        n = self.chunk_resolution
+        coords = (np.arange(n) + 0.5) * (self.chunk_size / n)
+        xs = cx * self.chunk_size + coords[None, :]
+        ys = cy * self.chunk_size + coords[:, None]
+        heightmap = world_noise(xs, ys, self.world_seed).astype(np.float32)
+        
+        # 低频噪声决定植被和聚落，使相邻区块的地形连续
+        center = ((cx + 0.5) * self.chunk_size, (cy + 0.5) * self.chunk_size)
+        height = float(heightmap.mean())
+        moisture = float(world_noise(np.array(center[0]), np.array(center[1]), self.world_seed + 1, scale=2048.0))
+        settlement = float(world_noise(np.array(center[0]), np.array(center[1]), self.world_seed + 2, octaves=2, scale=1024.0))
+        if height < 0.35:
+            terrain = "湖泊地形"
+        elif settlement > 0.7 and height < 0.6:
+            terrain = "城市地形"
+        elif height > 0.68:
+            terrain = "山地地形"
+        elif moisture > 0.5:
+            terrain = "森林地形"
+        else:
+            terrain = "平原地形"
+            
+        return WorldChunk(
+            cx=cx,
+            cy=cy,
+            terrain=terrain,
+            scene_prompt=f"{terrain.replace('地形', '')}，区块({cx}, {cy})",
+            generated_at=datetime.now().isoformat(),
+            heightmap=heightmap
+        )
+        
+    def chunk_weather(self, cx: int, cy: int, timestamp: Optional[float] = None) -> str:
+        """区块当前的天气状态，访问时按共享时间段和低频空间噪声计算，不随区块持久化
+
+        同一时间段内相邻区块的噪声值接近，共享区域天气；进入下一时间段后所有区块的天气一起变化。
+        """
+        bucket = int((timestamp if timestamp is not None else datetime.now().timestamp()) // self.weather_period)
+        center = ((cx + 0.5) * self.chunk_size, (cy + 0.5) * self.chunk_size)
+        # 时间段经SeedSequence混合成种子；直接把时间段加到种子上，相邻时段的格点值几乎相同
+        seed = int(np.random.SeedSequence([self.world_seed + 3, bucket]).generate_state(1)[0])
+        noise = float(world_noise(np.array(center[0]), np.array(center[1]), seed, octaves=1, scale=4096.0))
+        return self.weather_states[min(int(noise * len(self.weather_states)), len(self.weather_states) - 1)]
+        
+    def load_chunk(self, cx: int, cy: int) -> WorldChunk:
+        """获取区块：优先内存，其次磁盘，都没有时生成"""
+        chunk = self.chunk_store.get(cx, cy)
+        if chunk is not None:
+            return chunk
+            
+        with self._chunk_lock:
+            future = self._chunk_futures.get((cx, cy))
+        if future is not None:
+            return future.result()  # 等待正在进行的预取
+            
+        chunk = self._generate_chunk(cx, cy)
+        self.chunk_store.put(chunk)
+        return chunk
+        
+    def get_world_chunk(self) -> Dict[str, Any]:
+        """按玩家位置或区块坐标返回区块状态，可选渲染场景图并预取周边区块"""
+        if "x" in self.current_task and "y" in self.current_task:
+            cx, cy = self.chunk_coords(self.current_task["x"], self.current_task["y"])
+        elif "cx" in self.current_task and "cy" in self.current_task:
+            cx, cy = int(self.current_task["cx"]), int(self.current_task["cy"])
+        else:
+            raise ValueError("缺少玩家位置(x, y)或区块坐标(cx, cy)")
+            
+        chunk = self.load_chunk(cx, cy)
+        weather = self.chunk_weather(cx, cy)
+        effects = self._get_weather_effects(weather)
+        if self.current_task.get("render"):
+            # 场景图随当前天气变化，只在图片路径改变时更新区块
+            scene_image = self.preview_renderer.render_to_file(
+                {"terrain": chunk.terrain, "weather": weather, "time_of_day": self.time_of_day},
+                seed=hash((self.world_seed, cx, cy)) & 0xFFFFFFFF,
+                light_intensity=effects.get("light_intensity", 1.0)
+            )
+            if scene_image != chunk.scene_image:
+                chunk.scene_image = scene_image
+                self.chunk_store.mark_dirty(chunk)
+            
+        radius = int(self.current_task.get("prefetch_radius", 0))
+        if radius > 0:
+            self._schedule_prefetch(self._neighbours(cx, cy, radius))
+            
+        return {
+            "chunk": chunk.to_meta(),
+            "weather": weather,
+            "scene_prompt": f"{chunk.scene_prompt}，{weather}天气",
+            "effects": effects,
+            "status": "completed"
+        }
+        
+    def _neighbours(self, cx: int, cy: int, radius: int) -> List[tuple]:
+        return [
+            (cx + dx, cy + dy)
+            for dy in range(-radius, radius + 1)
+            for dx in range(-radius, radius + 1)
+            if (dx, dy) != (0, 0)
+        ]
+        
+    def prefetch_world_chunks(self) -> Dict[str, Any]:
+        """沿玩家路径预取区块及其周边区块"""
+        path = self.current_task.get("path")
+        if not path:
+            raise ValueError("缺少玩家路径path")
+        radius = int(self.current_task.get("radius", 1))
+        
+        targets = []
+        for x, y in path:
+            cx, cy = self.chunk_coords(x, y)
+            for coord in [(cx, cy)] + self._neighbours(cx, cy, radius):
+                if coord not in targets:
+                    targets.append(coord)
+        scheduled = self._schedule_prefetch(targets)
+        return {
+            "scheduled": scheduled,
+            "already_available": len(targets) - len(scheduled),
+            "status": "completed"
+        }
+        
+    def _schedule_prefetch(self, coords: List[tuple]) -> List[tuple]:
+        scheduled = []
+        for coord in coords:
+            if self.chunk_store.contains(*coord):
+                continue
+            with self._chunk_lock:
+                if coord in self._chunk_futures:
+                    continue
+                self._chunk_futures[coord] = self._chunk_executor.submit(self._prefetch_chunk, coord)
+            scheduled.append(coord)
+        return scheduled
+        
+    def _prefetch_chunk(self, coord: tuple) -> WorldChunk:
+        try:
+            chunk = self._generate_chunk(*coord)
+            self.chunk_store.put(chunk)
+            return chunk
+        finally:
+            with self._chunk_lock:
+                self._chunk_futures.pop(coord, None)
@@ -3,10 +3,47 @@ from datetime import datetime
 from ..core.base_agent import BaseAgent
 import numpy as np
 import pandas as pd
-from sklearn.cluster import KMeans
-from sklearn.ensemble import IsolationForest
-from sklearn.preprocessing import StandardScaler
+from .balance_models import BalanceModelManager
+from ..core.shared_state import SharedTelemetryRing, SharedFrame
+from ..core.event_bus import BalanceSuggestion
+from ..core.memory_budget import bound_frame, deep_size
+from collections import deque
+import os
 import json
+import threading
+
+# 平衡建议的默认阈值，可通过agent.thresholds覆盖
+DEFAULT_THRESHOLDS = {
+    "min_success_rate": 0.4,        # 实时成功率低于此值建议降低难度
+    "max_completion_time": 300,     # 实时平均完成时间高于此值建议优化流程
+    "min_completion_rate": 0.5,     # 整体完成率低于此值建议降低难度
+    "max_hard_cluster_share": 0.4,  # 最难聚类中的玩家比例超过此值建议优化难度曲线
+}
+
+# 建议规则表：(建议, 指标, 阈值名, 比较方向)，智能体和BalanceReplay共用
+REAL_TIME_RULES = [
+    ("建议降低当前关卡难度", "success_rate", "min_success_rate", "below"),
+    ("建议优化关卡流程设计", "average_completion_time", "max_completion_time", "above"),
+]
+ADJUSTMENT_RULES = [
+    ("降低关卡难度", "completion_rate", "min_completion_rate", "below"),
+    ("优化难度曲线", "hard_cluster_share", "max_hard_cluster_share", "above"),
+]
+ANOMALY_RULE = "检测到异常数据点，建议检查"
+
+def hardest_cluster(labels: np.ndarray, completion_time: np.ndarray) -> int:
+    """平均完成时间最长的难度聚类"""
+    clusters = np.unique(labels)
+    return int(max(clusters, key=lambda k: completion_time[labels == k].mean()))
+
+def evaluate_rules(rules: List[tuple], metrics: Dict[str, Any],
+                   thresholds: Dict[str, float]) -> Dict[str, Any]:
+    """按规则表比较指标和阈值，返回{建议: 是否触发}；指标为numpy数组时逐元素比较"""
+    hits = {}
+    for suggestion, metric, key, direction in rules:
+        value = metrics[metric]
+        hits[suggestion] = value < thresholds[key] if direction == "below" else value > thresholds[key]
+    return hits
 
 class GameBalancerAgent(BaseAgent):
     def __init__(self, agent_id: str, controller):
@@ -14,7 +51,20 @@ class GameBalancerAgent(BaseAgent):
         self.player_data = pd.DataFrame()
         self.real_time_data = []
         self.last_analysis_time = None
-        self.adjustment_history = []
+        # 调整记录只保留统计摘要（不含异常数据明细），条数有上限
+        self.adjustment_history = deque(maxlen=self.controller.memory_budget.adjustment_history)
+        self.thresholds = dict(DEFAULT_THRESHOLDS)
+        self.analysis_window = 10  # 累计多少条数据执行一次实时分析
+        self.batch_buffer: List[pd.DataFrame] = []
+        self._batch_rows = 0
+        self._batch_lock = threading.Lock()
+        # 持久化的异常检测和聚类模型，启动时加载最新版本
+        self.models = BalanceModelManager(f"models/game_balancer/{agent_id}")
+        if self.models.load_latest():
+            print(f"已加载平衡模型v{self.models.version}")
+        # 跨进程共享的遥测环和玩家数据，调用enable_shared_state/publish_player_data后启用
+        self.shared_telemetry: Optional[SharedTelemetryRing] = None
+        self.shared_player_data: Optional[SharedFrame] = None
         
     def process_task(self):
         """处理游戏平衡任务"""
@@ -29,8 +79,12 @@ class GameBalancerAgent(BaseAgent):
             return self.provide_adjustments()
         elif task_type == "real_time_analysis":
             return self.real_time_analysis()
+        elif task_type == "real_time_batch":
+            return self.ingest_batch(self.current_task.get("events"))
         elif task_type == "get_adjustment_history":
             return self.get_adjustment_history()
+        elif task_type == "model_info":
+            return {"status": "completed", "model": self.models.get_info()}
         else:
             raise ValueError(f"未知任务类型: {task_type}")
             
@@ -43,9 +97,11 @@ class GameBalancerAgent(BaseAgent):
         data = self.current_task["player_data"]
         data["timestamp"] = datetime.now().isoformat()
         self.real_time_data.append(data)
+        if self.shared_telemetry is not None:
+            self._share_telemetry(pd.DataFrame([data]))
         
         # 每10条数据执行一次分析
-        if len(self.real_time_data) >= 10:
+        if len(self.real_time_data) >= self.analysis_window:
             analysis = self._analyze_real_time_data()
             self.last_analysis_time = datetime.now()
             return {
@@ -55,26 +111,93 @@ class GameBalancerAgent(BaseAgent):
             }
         return {"status": "pending", "message": "等待更多数据"}
         
+    def ingest_batch(self, events) -> Dict[str, Any]:
+        """批量接收实时数据（事件列表、列数组字典或DataFrame），累计满窗口后整体分析"""
+        if events is None or len(events) == 0:
+            return {"status": "error", "message": "缺少玩家数据"}
+            
+        frame = events.copy() if isinstance(events, pd.DataFrame) else pd.DataFrame(events)
+        missing = [c for c in ("completion_time", "attempts", "success") if c not in frame.columns]
+        if missing:
+            return {"status": "error", "message": f"玩家数据缺少字段: {missing}"}
+        frame["timestamp"] = datetime.now().isoformat()
+        if self.shared_telemetry is not None:
+            self._share_telemetry(frame)
+        
+        with self._batch_lock:
+            self.batch_buffer.append(frame)
+            self._batch_rows += len(frame)
+            if self._batch_rows < self.analysis_window:
+                return {"status": "pending", "message": "等待更多数据", "buffered": self._batch_rows}
+            df = pd.concat(self.batch_buffer, ignore_index=True)
+            self.batch_buffer = []
+            self._batch_rows = 0
+            
+        analysis = self._analyze_frame(df)
+        self.last_analysis_time = datetime.now()
+        return {
+            "status": "completed",
+            "analysis": analysis,
+            "suggestions": self._generate_real_time_suggestions(analysis)
+        }
+        
+    def enable_shared_state(self, capacity: int = 100000, name: Optional[str] = None,
+                            path: Optional[str] = None) -> str:
+        """创建共享遥测环，其他进程可用SharedTelemetryRing.attach(name)零拷贝读取"""
+        if self.shared_telemetry is None:
+            self.shared_telemetry = SharedTelemetryRing.create(
+                ["timestamp", "completion_time", "attempts", "success"], capacity, name, path
+            )
+            self.controller.register_shared_state(self.agent_id, "telemetry", self.shared_telemetry.name)
+        return self.shared_telemetry.name
+        
+    def _share_telemetry(self, frame: pd.DataFrame):
+        rows = np.column_stack([
+            np.full(len(frame), datetime.now().timestamp()),
+            frame[["completion_time", "attempts", "success"]].to_numpy(dtype=np.float64)
+        ])
+        self.shared_telemetry.append(rows)
+        
+    def publish_player_data(self, name: Optional[str] = None, path: Optional[str] = None) -> str:
+        """将player_data的数值列发布到共享内存，替换之前发布的版本"""
+        if self.player_data.empty:
+            raise ValueError("没有可用的玩家数据")
+        if self.shared_player_data is not None:
+            self.shared_player_data.close()
+        self.shared_player_data = SharedFrame.publish(self.player_data, name, path)
+        self.controller.register_shared_state(self.agent_id, "player_data", self.shared_player_data.name)
+        return self.shared_player_data.name
+        
+    def close(self):
+        self.models.stop_scheduler()
+        super().close()
+        
+    def memory_usage(self) -> Dict[str, int]:
+        return {
+            "player_data": deep_size(self.player_data),
+            "adjustment_history": deep_size(self.adjustment_history),
+            "real_time_data": deep_size(self.real_time_data),
+            "batch_buffer": deep_size(self.batch_buffer),
+            "model_buffer": int(self.models._buffer.nbytes),
+        }
+        
     def get_adjustment_history(self) -> Dict[str, Any]:
         """获取调整历史记录"""
         return {
             "status": "completed",
-            "history": self.adjustment_history
+            "history": list(self.adjustment_history)
         }
         
     def _analyze_real_time_data(self) -> Dict[str, Any]:
         """分析实时数据"""
         df = pd.DataFrame(self.real_time_data)
         self.real_time_data = []  # 清空缓存
+        return self._analyze_frame(df)
         
-        # 标准化数据
-        scaler = StandardScaler()
-        features = df[["completion_time", "attempts", "success"]]
-        scaled_features = scaler.fit_transform(features)
-        
-        # 异常检测
-        clf = IsolationForest(contamination=0.1)
-        df["anomaly"] = clf.fit_predict(scaled_features)
+    def _analyze_frame(self, df: pd.DataFrame, score=None) -> Dict[str, Any]:
+        """对一批实时数据做统计和异常检测；score为只打分的检测函数时不记录训练数据（回放用）"""
+        features = df[["completion_time", "attempts", "success"]].values
+        df["anomaly"] = (score or self._detect_anomalies)(features)
         
         return {
             "average_completion_time": df["completion_time"].mean(),
@@ -83,31 +206,57 @@ class GameBalancerAgent(BaseAgent):
             "data_points": len(df)
         }
         
-    def _generate_real_time_suggestions(self, analysis: Dict) -> List[str]:
-        """生成实时调整建议"""
-        suggestions = []
+    def _detect_anomalies(self, features: np.ndarray) -> np.ndarray:
+        """对接收到的(completion_time, attempts, success)特征做异常检测，-1表示异常；数据同时用于重训练"""
+        self.models.observe(features)
+        return self.models.score(features)
+        
+    def _build_real_time_suggestions(self, analysis: Dict,
+                                     thresholds: Optional[Dict[str, float]] = None) -> List[str]:
+        """按阈值生成实时调整建议（不记录历史）"""
+        thresholds = thresholds or self.thresholds
+        hits = evaluate_rules(REAL_TIME_RULES, analysis, thresholds)
+        suggestions = [suggestion for suggestion, hit in hits.items() if hit]
         
-        if analysis["success_rate"] < 0.4:
-            suggestions.append("建议降低当前关卡难度")
-        if analysis["average_completion_time"] > 300:
-            suggestions.append("建议优化关卡流程设计")
         if analysis["anomalies"]:
             suggestions.append(f"检测到{len(analysis['anomalies'])}个异常数据点，建议检查")
+        return suggestions
+        
+    def _generate_real_time_suggestions(self, analysis: Dict) -> List[str]:
+        """生成实时调整建议"""
+        suggestions = self._build_real_time_suggestions(analysis)
             
         # 记录调整建议
         if suggestions:
             self.adjustment_history.append({
                 "timestamp": datetime.now().isoformat(),
                 "suggestions": suggestions,
-                "analysis": analysis
+                "success_rate": float(analysis["success_rate"]),
+                "average_completion_time": float(analysis["average_completion_time"]),
+                "anomaly_count": len(analysis["anomalies"]),
+                "data_points": analysis["data_points"]
             })
+            self.controller.event_bus.publish(BalanceSuggestion(
+                source=self.agent_id,
+                suggestions=suggestions,
+                success_rate=float(analysis["success_rate"]),
+                average_completion_time=float(analysis["average_completion_time"])
+            ))
             
         return suggestions
             
     def analyze_player_data(self) -> Dict[str, Any]:
         """分析玩家行为数据"""
         data = self.current_task["player_data"]
-        self.player_data = pd.DataFrame(data)
+        budget = self.controller.memory_budget
+        self.player_data = bound_frame(
+            pd.DataFrame(data), budget.player_data_rows,
+            os.path.join(budget.spill_dir, f"player_data_{self.agent_id}.csv") if budget.player_data_spill else None
+        )
+        if {"completion_time", "attempts", "success"}.issubset(self.player_data.columns):
+            self.models.observe(self.player_data[["completion_time", "attempts", "success"]].values)
+        if self.shared_player_data is not None:
+            self.publish_player_data()
         
         # 分析关键指标
         analysis = {
@@ -126,12 +275,13 @@ class GameBalancerAgent(BaseAgent):
         if self.player_data.empty:
             raise ValueError("没有可用的玩家数据")
             
-        suggestions = []
         # 根据分析结果生成建议
-        if self._calculate_completion_rate() < 0.5:
-            suggestions.append("降低关卡难度")
-        if len(self._cluster_difficulty_levels()) > 3:
-            suggestions.append("优化难度曲线")
+        metrics = {
+            "completion_rate": self._calculate_completion_rate(),
+            "hard_cluster_share": self._hard_cluster_share()
+        }
+        hits = evaluate_rules(ADJUSTMENT_RULES, metrics, self.thresholds)
+        suggestions = [suggestion for suggestion, hit in hits.items() if hit]
             
         return {
             "suggestions": suggestions,
@@ -150,8 +300,15 @@ class GameBalancerAgent(BaseAgent):
             return []
             
         X = self.player_data[["completion_time", "attempts"]].values
-        kmeans = KMeans(n_clusters=3).fit(X)
-        return kmeans.labels_.tolist()
+        return self.models.cluster(X).tolist()
+        
+    def _hard_cluster_share(self) -> float:
+        """落在最难聚类中的玩家比例"""
+        labels = np.asarray(self._cluster_difficulty_levels())
+        if len(labels) == 0:
+            return 0.0
+        hardest = hardest_cluster(labels, self.player_data["completion_time"].to_numpy())
+        return float(np.mean(labels == hardest))
         
     def _identify_hotspots(self) -> Dict[str, float]:
         """识别玩家卡点"""
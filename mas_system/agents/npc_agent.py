@@ -1,20 +1,65 @@
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 import os
 import json
+import shutil
 from ..core.base_agent import BaseAgent
+from ..core.warm_pool import WarmPool
+from .dialogue_cache import SemanticDialogueCache
+from ..core.shared_state import SharedHistoryRing
+from ..core.event_bus import WEATHER_CHANGED, DialogueTurn
+from ..core.memory_budget import DialogueHistory, deep_size
 import dashscope
 from http import HTTPStatus
 
 class NPCAgent(BaseAgent):
-    def __init__(self, agent_id: str, controller):
+    def __init__(self, agent_id: str, controller, personality: str = "友好且乐于助人"):
         super().__init__(agent_id, controller)
         self.dashscope_key = os.getenv("DASHSCOPE_API_KEY")
         if not self.dashscope_key:
             raise ValueError("未设置DASHSCOPE_API_KEY环境变量")
-        self.dialogue_history = []  # 对话历史记录
-        self.personality = "友好且乐于助人"  # NPC默认性格
+        budget = self.controller.memory_budget
+        # 对话历史：内存中只保留最近若干轮，更早的轮次追加到归档文件
+        self.dialogue_history = DialogueHistory(
+            budget.dialogue_turns, f"data/npc_dialogues_{agent_id}.archive.jsonl"
+        )
+        # 高频对话上下文的预生成池，调用warm_pool.start()开启后台预生成
+        self.warm_pool = WarmPool(
+            generator=self._pregenerate_dialogue,
+            variants_per_key=3,
+            budget=60,
+            idle_check=lambda: self.controller.get_agent_status(self.agent_id) == "idle",
+            max_keys=budget.warm_pool_keys
+        )
+        # 近似重复输入的语义缓存，命中时不再调用模型
+        self.semantic_cache = SemanticDialogueCache(capacity=budget.semantic_cache_entries, threshold=0.6)
+        self.semantic_cache_dir = f"data/npc_semantic_cache_{agent_id}"
+        self.semantic_cache_autosave = 20  # 每新增多少条回应保存一次索引
+        self._unsaved_cache_entries = 0
+        self.shared_history: Optional[SharedHistoryRing] = None  # 跨进程共享的最近对话
+        # 环境智能体发布的天气和时间，写入对话提示
+        self.world_state: Dict[str, str] = {}
+        self.weather_subscription = self.subscribe(WEATHER_CHANGED, self._on_weather_changed, max_queue=16)
+        self._personality = personality  # NPC性格，构造时传入以便加载与之匹配的语义缓存
         self.history_file = f"data/npc_dialogues_{agent_id}.json"
         self.load_dialogue_history()
+        for turn in self.dialogue_history:
+            self.warm_pool.record(turn.player_input)
+        self.load_semantic_cache()
+
+    @property
+    def personality(self) -> str:
+        return self._personality
+
+    @personality.setter
+    def personality(self, value: str):
+        """性格变化后预生成的对话和缓存的回应不再适用，内存和磁盘上的都需要失效"""
+        if value == self._personality:
+            return
+        self._personality = value
+        self.warm_pool.invalidate()
+        self.semantic_cache.clear()
+        self._unsaved_cache_entries = 0
+        shutil.rmtree(self.semantic_cache_dir, ignore_errors=True)
         
     def process_task(self):
         """处理NPC行为任务"""
@@ -35,7 +80,7 @@ class NPCAgent(BaseAgent):
         try:
             if os.path.exists(self.history_file):
                 with open(self.history_file, 'r', encoding='utf-8') as f:
-                    self.dialogue_history = json.load(f)
+                    self.dialogue_history.load(json.load(f))
         except Exception as e:
             print(f"加载对话历史失败: {e}")
 
@@ -44,35 +89,136 @@ class NPCAgent(BaseAgent):
         try:
             os.makedirs(os.path.dirname(self.history_file), exist_ok=True)
             with open(self.history_file, 'w', encoding='utf-8') as f:
-                json.dump(self.dialogue_history, f, ensure_ascii=False, indent=2)
+                json.dump(self.dialogue_history.to_list(), f, ensure_ascii=False, indent=2)
         except Exception as e:
             print(f"保存对话历史失败: {e}")
 
+    def load_semantic_cache(self):
+        """加载语义缓存，没有已保存的索引或索引由其他性格生成时用对话历史初始化"""
+        try:
+            if self._saved_personality() == self.personality and self.semantic_cache.load(self.semantic_cache_dir):
+                return
+        except Exception as e:
+            print(f"加载语义缓存失败: {e}")
+        self.semantic_cache.add_many(
+            (turn.player_input, {"npc_response": turn.npc_response, "sentiment": None})
+            for turn in self.dialogue_history
+            if turn.npc_response
+        )
+
+    def save_semantic_cache(self):
+        """保存语义缓存索引到文件，同时记录生成这些回应时的性格"""
+        try:
+            self.semantic_cache.save(self.semantic_cache_dir)
+            with open(os.path.join(self.semantic_cache_dir, "personality.txt"), "w", encoding="utf-8") as f:
+                f.write(self.personality)
+            self._unsaved_cache_entries = 0
+        except Exception as e:
+            print(f"保存语义缓存失败: {e}")
+
+    def _saved_personality(self) -> Optional[str]:
+        path = os.path.join(self.semantic_cache_dir, "personality.txt")
+        if not os.path.exists(path):
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            return f.read()
+
+    def _on_weather_changed(self, events):
+        """只关心最新的天气，变化后预生成的对话不再适用"""
+        latest = events[-1]
+        if self.world_state.get("weather") != latest.weather:
+            self.warm_pool.invalidate()
+        self.world_state = {"weather": latest.weather, "time_of_day": latest.time_of_day}
+
+    def _world_prompt(self) -> str:
+        world_state = self.world_state
+        if not world_state:
+            return ""
+        return f"当前天气：{world_state['weather']}，时间：{world_state['time_of_day']}，回应时可自然地提及周围环境。"
+
+    def enable_shared_history(self, capacity: int = 256, name: Optional[str] = None,
+                              path: Optional[str] = None) -> str:
+        """创建共享对话历史环，其他进程可用SharedHistoryRing.attach(name)读取"""
+        if self.shared_history is None:
+            self.shared_history = SharedHistoryRing.create(capacity, name=name, path=path)
+            for turn in self.dialogue_history.recent(capacity):
+                self.shared_history.append(turn.player_input, turn.npc_response)
+            self.controller.register_shared_state(self.agent_id, "dialogue_history", self.shared_history.name)
+        return self.shared_history.name
+
+    def close(self):
+        self.warm_pool.stop()
+        super().close()
+
+    def memory_usage(self) -> Dict[str, int]:
+        return {
+            "dialogue_history": deep_size(self.dialogue_history),
+            "semantic_cache": deep_size(self.semantic_cache),
+            "warm_pool": deep_size(self.warm_pool),
+        }
+
     def clear_dialogue_history(self):
         """清空对话历史"""
-        self.dialogue_history = []
+        self.dialogue_history.clear()
         self.save_dialogue_history()
         return {"status": "completed", "message": "对话历史已清空"}
 
+    def _pregenerate_dialogue(self, context: str) -> Optional[Dict[str, Any]]:
+        """为高频上下文预生成一条回应及其情感分析（不带对话历史）"""
+        response = self._call_model(
+            "npc_pregenerate", len(context),
+            messages=[{
+                "role": "system",
+                "content": f"你是一个游戏NPC，性格特点：{self.personality}。需要根据对话上下文生成自然的回应" + self._world_prompt()
+            }, {
+                "role": "user",
+                "content": context
+            }],
+            temperature=0.9,
+            result_format='message'
+        )
+        if response.status_code != HTTPStatus.OK:
+            return None
+        npc_response = response.output.choices[0].message.content
+        return {
+            "npc_response": npc_response,
+            "sentiment": self.analyze_sentiment(npc_response)
+        }
+
     def generate_dialogue(self) -> Dict[str, str]:
         """生成NPC对话"""
         context = self.current_task["context"]
         
+        pooled = self.warm_pool.get(context)
+        if pooled:
+            return self._finish_dialogue(context, pooled["npc_response"], pooled["sentiment"])
+            
+        cached = self.semantic_cache.lookup(context)
+        # 带天气的缓存回应只在相同天气下复用，未提及天气的回应适用于任何天气
+        if cached and cached["response"].get("weather") in (None, self.world_state.get("weather")):
+            cached_response = cached["response"]
+            sentiment = cached_response["sentiment"]
+            if sentiment is None:
+                sentiment = cached_response["sentiment"] = self.analyze_sentiment(cached_response["npc_response"])
+            result = self._finish_dialogue(context, cached_response["npc_response"], sentiment)
+            result["similarity"] = cached["similarity"]
+            return result
+            
         # 构建对话历史
         messages = [{
             "role": "system",
-            "content": f"你是一个游戏NPC，性格特点：{self.personality}。需要根据对话上下文生成自然的回应"
+            "content": f"你是一个游戏NPC，性格特点：{self.personality}。需要根据对话上下文生成自然的回应" + self._world_prompt()
         }]
         
         # 添加历史对话
-        for dialogue in self.dialogue_history[-5:]:  # 保留最近5轮对话
+        for turn in self.dialogue_history.recent(5):  # 保留最近5轮对话
             messages.append({
                 "role": "user",
-                "content": dialogue["player_input"]
+                "content": turn.player_input
             })
             messages.append({
                 "role": "assistant",
-                "content": dialogue["npc_response"]
+                "content": turn.npc_response
             })
             
         # 添加当前对话
@@ -81,9 +227,8 @@ class NPCAgent(BaseAgent):
             "content": context
         })
         
-        dashscope.api_key = self.dashscope_key
-        response = dashscope.Generation.call(
-            model='qwen-max',
+        response = self._call_model(
+            "npc_dialogue", len(context),
             messages=messages,
             temperature=0.7,
             result_format='message'
@@ -96,12 +241,31 @@ class NPCAgent(BaseAgent):
             }
             
         npc_response = response.output.choices[0].message.content
+        sentiment = self.analyze_sentiment(npc_response)
         
-        # 记录对话历史
-        self.dialogue_history.append({
-            "player_input": context,
-            "npc_response": npc_response
+        # 写入语义缓存，定期保存索引
+        self.semantic_cache.add(context, {
+            "npc_response": npc_response,
+            "sentiment": sentiment,
+            "weather": self.world_state.get("weather")
         })
+        self._unsaved_cache_entries += 1
+        if self._unsaved_cache_entries >= self.semantic_cache_autosave:
+            self.save_semantic_cache()
+            
+        return self._finish_dialogue(context, npc_response, sentiment)
+
+    def _finish_dialogue(self, context: str, npc_response: str,
+                         sentiment: Dict[str, Any]) -> Dict[str, Any]:
+        """记录并保存对话历史，返回带情感表情的对话结果"""
+        # 记录对话历史
+        self.dialogue_history.append(context, npc_response)
+        if self.shared_history is not None:
+            self.shared_history.append(context, npc_response)
+        self.controller.event_bus.publish(DialogueTurn(
+            source=self.agent_id, player_input=context, npc_response=npc_response,
+            sentiment=sentiment.get("label")
+        ))
         
         # 保存对话历史
         self.save_dialogue_history()
@@ -112,7 +276,6 @@ class NPCAgent(BaseAgent):
             "neutral": "😐", 
             "negative": "😢"
         }
-        sentiment = self.analyze_sentiment(npc_response)
         icon = emotion_icons.get(sentiment["label"], "💬")
         
         return {
@@ -121,10 +284,18 @@ class NPCAgent(BaseAgent):
             "sentiment": sentiment
         }
         
+    def _call_model(self, route: str, input_chars: int, **params):
+        """按模型路由策略选择模型调用DashScope，并记录延迟"""
+        dashscope.api_key = self.dashscope_key
+        with self.controller.model_router.route(route, input_chars) as call:
+            response = dashscope.Generation.call(model=call.model, **params)
+            call.ok = response.status_code == HTTPStatus.OK
+        return response
+
     def analyze_sentiment(self, text: str) -> Dict[str, Any]:
         """分析文本情感"""
-        response = dashscope.Generation.call(
-            model='qwen-max',
+        response = self._call_model(
+            "sentiment", len(text),
             messages=[{
                 "role": "system",
                 "content": "分析以下文本的情感倾向，返回label(positive/neutral/negative)和score(0-1)"
@@ -147,14 +318,11 @@ class NPCAgent(BaseAgent):
         player_input = self.current_task["player_input"]
         
         # 记录玩家输入
-        self.dialogue_history.append({
-            "player_input": player_input,
-            "npc_response": None
-        })
+        self.dialogue_history.append(player_input)
         
         # 情感分析
-        sentiment_response = dashscope.Generation.call(
-            model='qwen-max',
+        sentiment_response = self._call_model(
+            "sentiment", len(player_input),
             messages=[{
                 "role": "system",
                 "content": "分析以下文本的情感倾向，返回label(positive/neutral/negative)和score(0-1)"
@@ -183,15 +351,14 @@ class NPCAgent(BaseAgent):
         
         messages = [{
             "role": "system",
-            "content": f"你是一个游戏NPC，玩家当前情感状态为{sentiment['label']}(置信度{sentiment['score']:.2f})，请以{tone}的语气回应"
+            "content": f"你是一个游戏NPC，玩家当前情感状态为{sentiment['label']}(置信度{sentiment['score']:.2f})，请以{tone}的语气回应" + self._world_prompt()
         }, {
             "role": "user", 
             "content": player_input
         }]
         
-        dashscope.api_key = self.dashscope_key
-        response = dashscope.Generation.call(
-            model='qwen-max',
+        response = self._call_model(
+            "npc_emotional", len(player_input),
             messages=messages,
             temperature=0.7,
             result_format='message'
@@ -206,8 +373,15 @@ class NPCAgent(BaseAgent):
         npc_response = response.output.choices[0].message.content
         
         # 更新最后一条记录的NPC响应
-        if self.dialogue_history and self.dialogue_history[-1]["npc_response"] is None:
-            self.dialogue_history[-1]["npc_response"] = npc_response
+        last_turn = self.dialogue_history.last
+        if last_turn is not None and last_turn.npc_response is None:
+            last_turn.npc_response = npc_response
+        if self.shared_history is not None:
+            self.shared_history.append(player_input, npc_response)
+        self.controller.event_bus.publish(DialogueTurn(
+            source=self.agent_id, player_input=player_input, npc_response=npc_response,
+            sentiment=sentiment.get("label")
+        ))
             
         return {
             "response": npc_response,
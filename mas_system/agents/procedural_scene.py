@@ -0,0 +1,162 @@
+from typing import Any, Dict, Optional, Tuple
+from pathlib import Path
+import os
+import threading
+import zlib
+import numpy as np
+from PIL import Image
+import cv2
+
+# 不同时段的天空颜色（顶部, 地平线），RGB
+SKY_COLORS = {
+    "day": ((70, 130, 210), (185, 215, 240)),
+    "dusk": ((60, 60, 120), (240, 150, 90)),
+    "night": ((8, 12, 35), (35, 45, 80)),
+}
+
+# 地形配色（远处, 近处）
+TERRAIN_COLORS = {
+    "forest": ((40, 85, 45), (20, 60, 25)),
+    "city": ((110, 110, 120), (70, 70, 80)),
+    "default": ((120, 150, 80), (90, 110, 60)),
+}
+
+class ProceduralSceneRenderer:
+    """基于numpy噪声合成的本地场景预览生成器，毫秒级返回，可离线使用"""
+
+    def __init__(self, size: Tuple[int, int] = (384, 384), output_dir: str = "static/images"):
+        self.width, self.height = size
+        self.output_dir = Path(output_dir)
+
+    def _fbm(self, rng, shape: Tuple[int, int], octaves: int = 4, base: int = 4) -> np.ndarray:
+        """分形值噪声：低分辨率随机网格放大后叠加，返回[0, 1]"""
+        h, w = shape
+        result = np.zeros(shape, dtype=np.float32)
+        amplitude, total = 1.0, 0.0
+        for octave in range(octaves):
+            cells = base * 2 ** octave
+            grid = rng.random((cells + 1, cells + 1), dtype=np.float32)
+            result += amplitude * cv2.resize(grid, (w, h), interpolation=cv2.INTER_CUBIC)
+            total += amplitude
+            amplitude *= 0.5
+        result /= total
+        return np.clip((result - result.min()) / (np.ptp(result) + 1e-6), 0, 1)
+
+    @staticmethod
+    def _period(time_of_day: str) -> str:
+        try:
+            hour = int(str(time_of_day).split(":")[0])
+        except ValueError:
+            return "day"
+        if 7 <= hour < 17:
+            return "day"
+        if 5 <= hour < 7 or 17 <= hour < 19:
+            return "dusk"
+        return "night"
+
+    @staticmethod
+    def _terrain_kind(terrain: str) -> str:
+        if "森林" in terrain:
+            return "forest"
+        if "城市" in terrain:
+            return "city"
+        return "default"
+
+    def render(self, elements: Dict[str, Any], seed: Optional[int] = None,
+               light_intensity: float = 1.0) -> np.ndarray:
+        """根据_analyze_scene_elements的结果合成RGB图像"""
+        rng = np.random.default_rng(seed)
+        h, w = self.height, self.width
+        period = self._period(elements.get("time_of_day", "12:00"))
+        weather = elements.get("weather", "sunny")
+        kind = self._terrain_kind(elements.get("terrain", ""))
+        y = np.linspace(0, 1, h, dtype=np.float32)[:, None, None]
+
+        # 天空渐变
+        top, horizon = (np.array(c, dtype=np.float32) for c in SKY_COLORS[period])
+        image = np.broadcast_to(top + (horizon - top) * y, (h, w, 3)).copy()
+
+        # 云层
+        cloud_cover = {"sunny": 0.15, "cloudy": 0.6, "rainy": 0.75, "foggy": 0.4, "stormy": 0.9}.get(weather, 0.3)
+        clouds = self._fbm(rng, (h, w), octaves=5)
+        cloud_alpha = np.clip((clouds - (1 - cloud_cover)) * 3, 0, 1)[..., None] * (1 - y)
+        cloud_color = 60.0 if weather == "stormy" else (230.0 if period == "day" else 120.0)
+        image = image * (1 - cloud_alpha) + cloud_color * cloud_alpha
+
+        if weather == "sunny" and period != "night":
+            yy, xx = np.ogrid[:h, :w]
+            cx, cy, r = int(w * 0.75), int(h * 0.18), max(h // 16, 4)
+            glow = np.exp(-((xx - cx) ** 2 + (yy - cy) ** 2) / (2.0 * r * r))[..., None]
+            image = image + glow * np.array([255, 240, 180], dtype=np.float32) * 0.9
+
+        # 地平线轮廓
+        horizon_y = int(h * 0.55)
+        ridge = self._fbm(rng, (1, w), octaves=4, base=3)[0]
+        if kind == "city":
+            # 建筑剪影：按街区宽度重复随机楼高
+            blocks = rng.integers(8, 24, size=w // 8 + 1)
+            heights = rng.uniform(0.05, 0.3, size=len(blocks))
+            ridge = np.repeat(heights, blocks)[:w]
+        else:
+            ridge = ridge * (0.12 if kind == "default" else 0.2)
+        ridge_rows = (horizon_y - ridge * h).astype(np.int32)
+        rows = np.arange(h)[:, None]
+        ground = rows >= ridge_rows[None, :]
+
+        far, near = (np.array(c, dtype=np.float32) for c in TERRAIN_COLORS[kind])
+        depth = np.clip((rows - ridge_rows[None, :]) / max(h - horizon_y, 1), 0, 1)[..., None]
+        texture = self._fbm(rng, (h, w), octaves=5, base=16 if kind == "forest" else 8)[..., None]
+        terrain = far + (near - far) * depth
+        terrain = terrain * (0.75 + 0.5 * texture)
+        if kind == "city" and period != "day":
+            # 夜间窗户灯光
+            lights = (rng.random((h, w)) > 0.985)[..., None]
+            terrain = np.where(lights, np.array([255, 220, 140], dtype=np.float32), terrain)
+        image = np.where(ground[..., None], terrain, image)
+
+        # 天气效果
+        if weather in ("rainy", "stormy"):
+            drops = (rng.random((h, w)) > (0.995 if weather == "rainy" else 0.99)).astype(np.float32)
+            kernel = np.zeros((15, 15), dtype=np.float32)
+            np.fill_diagonal(np.fliplr(kernel), 1.0 / 15)
+            streaks = cv2.filter2D(drops, -1, kernel)[..., None]
+            image = image * 0.85 + np.clip(streaks * 8, 0, 1) * 180
+        if weather == "foggy":
+            fog = cv2.GaussianBlur(0.35 + 0.4 * self._fbm(rng, (h, w), octaves=3), (0, 0), 8)[..., None]
+            image = image * (1 - fog) + 200 * fog
+
+        image *= light_intensity * (0.6 if period == "night" else 1.0)
+        return np.clip(image, 0, 255).astype(np.uint8)
+
+    def render_to_file(self, elements: Dict[str, Any], seed: Optional[int] = None,
+                       light_intensity: float = 1.0) -> str:
+        """渲染并保存到static/images，返回本地URL
+
+        文件名由种子和影响画面的参数决定，相同参数的预览已存在时直接返回，不重复写盘。
+        """
+        if seed is None:
+            seed = int(np.random.default_rng().integers(2 ** 32))
+        params = (
+            self.width, self.height,
+            self._period(elements.get("time_of_day", "12:00")),
+            elements.get("weather", "sunny"),
+            self._terrain_kind(elements.get("terrain", "")),
+            round(float(light_intensity), 3),
+        )
+        image_name = f"preview_{seed}_{zlib.crc32(repr(params).encode('utf-8')):08x}.png"
+        local_url = f"/{self.output_dir.as_posix().strip('/')}/{image_name}"
+        local_path = self.output_dir / image_name
+        if local_path.exists():
+            return local_url
+        image = self.render(elements, seed, light_intensity)
+        local_path.parent.mkdir(parents=True, exist_ok=True)
+        # 先写临时文件再替换，并发渲染同一预览时读者不会看到写了一半的文件
+        tmp_path = local_path.with_name(f"{image_name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        Image.fromarray(image).save(tmp_path, format="PNG", optimize=False, compress_level=1)
+        os.replace(tmp_path, local_path)
+        return local_url
+
+    @staticmethod
+    def seed_for(prompt: str) -> int:
+        """同一描述生成相同的预览"""
+        return zlib.crc32(prompt.encode("utf-8"))
@@ -0,0 +1,109 @@
+from typing import Any, Callable, Dict, List, Optional
+from collections import deque
+import queue
+import threading
+import time
+
+class TelemetryIngestor:
+    """遥测接入前端：汇聚多个游戏服务器的事件，按数量或时间组成微批次，异步交给GameBalancerAgent分析
+
+    生产者只做非阻塞入队，不等待sklearn分析；分析在独立线程中进行，
+    分析积压时会把排队的多个微批次合并为一次ingest_batch调用。
+    """
+
+    def __init__(self, agent, max_batch: int = 500, max_delay: float = 0.05,
+                 queue_size: int = 100000, on_result: Optional[Callable[[Dict[str, Any]], None]] = None):
+        self.agent = agent
+        self.max_batch = max_batch      # 微批次最大事件数
+        self.max_delay = max_delay      # 微批次最长等待时间（秒）
+        self.on_result = on_result
+        self.results: deque = deque(maxlen=100)  # 最近的分析结果
+        self.stats = {"accepted": 0, "dropped": 0, "batches": 0, "analyses": 0}
+        self._events: queue.Queue = queue.Queue(maxsize=queue_size)
+        self._batches: queue.Queue = queue.Queue()
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+
+    def submit(self, event: Dict[str, Any]) -> bool:
+        """提交单条事件，队列满时丢弃并返回False"""
+        try:
+            self._events.put_nowait(event)
+        except queue.Full:
+            self.stats["dropped"] += 1
+            return False
+        self.stats["accepted"] += 1
+        return True
+
+    def submit_many(self, events: List[Dict[str, Any]]) -> int:
+        """提交多条事件，返回成功入队的数量"""
+        return sum(1 for event in events if self.submit(event))
+
+    def start(self):
+        if self._threads:
+            return
+        self._stop.clear()
+        self._threads = [
+            threading.Thread(target=self._collect_loop, daemon=True),
+            threading.Thread(target=self._analysis_loop, daemon=True),
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self, timeout: Optional[float] = None):
+        """停止接入，已入队的事件会先处理完"""
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def _collect_loop(self):
+        while not (self._stop.is_set() and self._events.empty()):
+            try:
+                first = self._events.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            batch = [first]
+            deadline = time.monotonic() + self.max_delay
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._events.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self.stats["batches"] += 1
+            self._batches.put(batch)
+        self._batches.put(None)  # 通知分析线程结束
+
+    def _analysis_loop(self):
+        while True:
+            batch = self._batches.get()
+            if batch is None:
+                return
+            # 分析跟不上时合并积压的微批次
+            finished = False
+            while True:
+                try:
+                    more = self._batches.get_nowait()
+                except queue.Empty:
+                    break
+                if more is None:
+                    finished = True
+                    break
+                batch.extend(more)
+
+            try:
+                result = self.agent.ingest_batch(batch)
+            except Exception as e:
+                result = {"status": "failed", "error": str(e)}
+            if result.get("status") != "pending":
+                self.stats["analyses"] += 1
+                self.results.append(result)
+                if self.on_result:
+                    try:
+                        self.on_result(result)
+                    except Exception as e:
+                        print(f"分析结果回调失败: {e}")
+            if finished:
+                return
@@ -0,0 +1,133 @@
+from typing import Any, Dict, List, Optional, Tuple
+from dataclasses import dataclass, asdict, field
+from collections import OrderedDict
+import os
+import json
+import threading
+import numpy as np
+
+@dataclass
+class WorldChunk:
+    cx: int
+    cy: int
+    terrain: str
+    scene_prompt: str
+    generated_at: str
+    heightmap: np.ndarray = field(repr=False, default=None)
+    scene_image: Optional[str] = None
+
+    def to_meta(self) -> Dict[str, Any]:
+        """返回不含高度图的元数据"""
+        meta = asdict(self)
+        meta.pop("heightmap")
+        heights = np.asarray(self.heightmap)
+        meta["height_range"] = [float(heights.min()), float(heights.max())]
+        return meta
+
+def _lattice(ix: np.ndarray, iy: np.ndarray, seed: int) -> np.ndarray:
+    """整数格点的确定性哈希值，返回[0, 1)，保证相邻区块边界连续"""
+    with np.errstate(over="ignore"):  # 依赖uint64乘法溢出回绕
+        h = (np.asarray(ix).astype(np.uint64) * np.uint64(0x9E3779B97F4A7C15)
+             ^ np.asarray(iy).astype(np.uint64) * np.uint64(0xC2B2AE3D27D4EB4F)
+             ^ np.uint64(seed & 0xFFFFFFFFFFFFFFFF))
+        h ^= h >> np.uint64(33)
+        h = h * np.uint64(0xFF51AFD7ED558CCD)
+        h ^= h >> np.uint64(33)
+    return (h >> np.uint64(11)).astype(np.float64) / float(1 << 53)
+
+def world_noise(x: np.ndarray, y: np.ndarray, seed: int, octaves: int = 4,
+                scale: float = 512.0) -> np.ndarray:
+    """世界坐标上的分形值噪声，返回[0, 1]"""
+    result = np.zeros(np.broadcast(x, y).shape, dtype=np.float64)
+    amplitude, total, freq = 1.0, 0.0, 1.0 / scale
+    for octave in range(octaves):
+        fx, fy = x * freq, y * freq
+        x0, y0 = np.floor(fx).astype(np.int64), np.floor(fy).astype(np.int64)
+        tx, ty = fx - x0, fy - y0
+        tx, ty = tx * tx * (3 - 2 * tx), ty * ty * (3 - 2 * ty)
+        s = seed + octave * 1013
+        top = _lattice(x0, y0, s) * (1 - tx) + _lattice(x0 + 1, y0, s) * tx
+        bottom = _lattice(x0, y0 + 1, s) * (1 - tx) + _lattice(x0 + 1, y0 + 1, s) * tx
+        result += amplitude * (top * (1 - ty) + bottom * ty)
+        total += amplitude
+        amplitude *= 0.5
+        freq *= 2.0
+    return result / total
+
+class ChunkStore:
+    """已加载区块的有界LRU；被淘汰的区块写入磁盘，再次访问时以内存映射方式加载"""
+
+    def __init__(self, storage_dir: str = "data/world_chunks", max_loaded: int = 64):
+        self.storage_dir = storage_dir
+        self.max_loaded = max_loaded
+        self.loaded: "OrderedDict[Tuple[int, int], WorldChunk]" = OrderedDict()
+        self.stats = {"hits": 0, "disk_loads": 0, "evictions": 0}
+        self._lock = threading.RLock()
+
+    def _paths(self, cx: int, cy: int) -> Tuple[str, str]:
+        base = os.path.join(self.storage_dir, f"{cx}_{cy}")
+        return base + ".npy", base + ".json"
+
+    def get(self, cx: int, cy: int) -> Optional[WorldChunk]:
+        key = (cx, cy)
+        with self._lock:
+            if key in self.loaded:
+                self.loaded.move_to_end(key)
+                self.stats["hits"] += 1
+                return self.loaded[key]
+
+        height_path, meta_path = self._paths(cx, cy)
+        if not (os.path.exists(height_path) and os.path.exists(meta_path)):
+            return None
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        meta.pop("height_range", None)
+        meta.pop("weather", None)  # 旧版本区块文件中的固定天气，天气现在按访问时间计算
+        chunk = WorldChunk(heightmap=np.load(height_path, mmap_mode="r"), **meta)
+        with self._lock:
+            self.stats["disk_loads"] += 1
+        self.put(chunk, persisted=True)
+        return chunk
+
+    def put(self, chunk: WorldChunk, persisted: bool = False):
+        with self._lock:
+            key = (chunk.cx, chunk.cy)
+            self.loaded[key] = chunk
+            self.loaded.move_to_end(key)
+            if not persisted:
+                chunk._dirty = True
+            while len(self.loaded) > self.max_loaded:
+                _, evicted = self.loaded.popitem(last=False)
+                self.stats["evictions"] += 1
+                self._persist(evicted)
+
+    def contains(self, cx: int, cy: int) -> bool:
+        with self._lock:
+            if (cx, cy) in self.loaded:
+                return True
+        return os.path.exists(self._paths(cx, cy)[1])
+
+    def _persist(self, chunk: WorldChunk):
+        if not getattr(chunk, "_dirty", False):
+            return
+        os.makedirs(self.storage_dir, exist_ok=True)
+        height_path, meta_path = self._paths(chunk.cx, chunk.cy)
+        if not isinstance(chunk.heightmap, np.memmap):
+            # 从磁盘映射加载的高度图未变化，只需更新元数据
+            np.save(height_path, np.asarray(chunk.heightmap, dtype=np.float32))
+        with open(meta_path, "w", encoding="utf-8") as f:
+            json.dump(chunk.to_meta(), f, ensure_ascii=False)
+        chunk._dirty = False
+
+    def mark_dirty(self, chunk: WorldChunk):
+        chunk._dirty = True
+
+    def flush(self):
+        """将所有已加载且有修改的区块写入磁盘"""
+        with self._lock:
+            for chunk in self.loaded.values():
+                self._persist(chunk)
+
+    def loaded_keys(self) -> List[Tuple[int, int]]:
+        with self._lock:
+            return list(self.loaded.keys())
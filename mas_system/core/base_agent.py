@@ -6,15 +6,32 @@ class BaseAgent:
         self.agent_id = agent_id
         self.controller = controller
         self.current_task = None
+        self.subscriptions = []  # 事件总线订阅，close时退订
         self.register_with_controller()
         
     def register_with_controller(self):
         """向中央控制器注册"""
         self.controller.register_agent(
             agent_id=self.agent_id,
-            agent_type=self.__class__.__name__
+            agent_type=self.__class__.__name__,
+            agent=self
         )
         
+    def subscribe(self, topic: str, handler, **kwargs):
+        """订阅事件总线上的主题，智能体close时自动退订"""
+        subscription = self.controller.event_bus.subscribe(
+            topic, handler, name=f"{self.agent_id}-{topic}", **kwargs
+        )
+        self.subscriptions.append(subscription)
+        return subscription
+        
+    def close(self):
+        """退订事件、停止后台线程并从控制器注销；子类释放自己的资源后调用此方法"""
+        for subscription in self.subscriptions:
+            subscription.unsubscribe()
+        self.subscriptions = []
+        self.controller.unregister_agent(self.agent_id)
+        
     def receive_task(self, task: Dict[str, Any]):
         """接收来自控制器的任务"""
         self.current_task = task
@@ -32,6 +49,23 @@ class BaseAgent:
         )
         return result
         
+    def run_task(self, task: Dict[str, Any]):
+        """接收并执行任务，执行异常时同样恢复为空闲状态"""
+        self.receive_task(task)
+        try:
+            result = self.process_task()
+        except Exception:
+            if self.current_task is task:
+                self.complete_task(None)
+            raise
+        if self.current_task is not task:
+            return result  # 任务已被控制器超时回收
+        return self.complete_task(result)
+        
+    def memory_usage(self) -> Dict[str, int]:
+        """主要数据结构的内存占用（字节），由子类按需实现"""
+        return {}
+        
     def process_task(self):
         """处理任务的具体实现（由子类实现）"""
         raise NotImplementedError
@@ -1,5 +1,13 @@
-from typing import Dict, List
+from typing import Any, Dict, List, Optional
 from dataclasses import dataclass
+from .task_journal import TaskJournal
+from .model_router import ModelRouter
+from .event_bus import EventBus
+from .memory_budget import MemoryBudget, MemoryReporter, SpillQueue, deep_size
+import os
+import threading
+import time
+import uuid
 
 @dataclass
 class AgentInfo:
@@ -7,20 +15,57 @@ class AgentInfo:
     agent_type: str
     status: str = "idle"
 
+@dataclass
+class RetryPolicy:
+    max_attempts: int = 1
+    timeout: Optional[float] = None       # 单次执行超时（秒），None表示不限制
+    backoff: float = 0.5                  # 重试间隔（秒），按尝试次数指数增长
+    retry_on_failed_status: bool = False  # 任务返回status=failed时是否也重试
+
 class CentralController:
-    def __init__(self):
+    def __init__(self, journal_path: Optional[str] = None,
+                 memory_budget: Optional[MemoryBudget] = None):
+        self.memory_budget = memory_budget or MemoryBudget()
         self.agents: Dict[str, AgentInfo] = {}
-        self.task_queue: List[dict] = []
+        # 有界任务队列，超出内存上限的任务按顺序写入磁盘
+        self.task_queue = SpillQueue(
+            self.memory_budget.task_queue,
+            os.path.join(self.memory_budget.spill_dir, f"task_queue_{uuid.uuid4().hex[:8]}.jsonl")
+        )
+        self.agent_instances: Dict[str, Any] = {}
+        self.retry_policies: Dict[str, RetryPolicy] = {}
+        self.default_retry_policy = RetryPolicy()
+        # 任务日志默认关闭：每条状态记录都会fsync，开启后吞吐降到每秒数千个任务
+        self.journal = TaskJournal(journal_path) if journal_path else None
+        self._journaled: set = set()  # 已写入任务负载、尚未结束的task_id
+        self._workers: Dict[str, set] = {}  # agent_id -> 仍在运行的超时工作线程
+        self._workers_lock = threading.Lock()
+        self.shared_state: Dict[str, Dict[str, str]] = {}  # agent_id -> {状态名: 共享块名称}
+        self.model_router = ModelRouter(config_path="config/model_routes.json")
+        self.event_bus = EventBus()  # 智能体间的状态变化事件
+        self.memory_reporter = MemoryReporter(self, self.memory_budget.report_interval)
         
-    def register_agent(self, agent_id: str, agent_type: str):
+    def register_agent(self, agent_id: str, agent_type: str, agent: Any = None):
         """注册新智能体"""
         self.agents[agent_id] = AgentInfo(
             agent_id=agent_id,
             agent_type=agent_type
         )
+        if agent is not None:
+            self.agent_instances[agent_id] = agent
+        
+    def unregister_agent(self, agent_id: str):
+        """注销智能体，由BaseAgent.close调用"""
+        self.agents.pop(agent_id, None)
+        self.agent_instances.pop(agent_id, None)
+        self.shared_state.pop(agent_id, None)
         
     def dispatch_task(self, task: dict):
         """分配任务给合适的智能体"""
+        task.setdefault("task_id", uuid.uuid4().hex)
+        if self.journal:
+            self._journal(task["task_id"], "pending", task=task)
+            self._journaled.add(task["task_id"])
         self.task_queue.append(task)
         
     def get_agent_status(self, agent_id: str) -> str:
@@ -30,3 +75,196 @@ class CentralController:
     def update_agent_status(self, agent_id: str, status: str):
         """更新智能体状态"""
         self.agents[agent_id].status = status
+
+    def register_shared_state(self, agent_id: str, key: str, name: str):
+        """登记智能体发布的共享状态块，供其他进程按名称附加"""
+        self.shared_state.setdefault(agent_id, {})[key] = name
+
+    def get_shared_state(self, agent_id: str) -> Dict[str, str]:
+        """获取智能体发布的共享状态块名称"""
+        return dict(self.shared_state.get(agent_id, {}))
+
+    def get_route_stats(self) -> Dict[str, Any]:
+        """获取各任务类型的模型路由统计"""
+        return self.model_router.stats()
+
+    def memory_usage(self) -> Dict[str, int]:
+        """控制器自身主要数据结构的内存占用（字节）"""
+        return {
+            "task_queue": deep_size(self.task_queue),
+            "task_queue_spilled": self.task_queue.spilled,
+        }
+
+    def memory_report(self) -> Dict[str, Any]:
+        """立即生成一次各智能体的内存报告"""
+        return self.memory_reporter.report()
+
+    def start_memory_reports(self, interval: Optional[float] = None):
+        """按间隔在后台输出内存报告"""
+        if interval is not None:
+            self.memory_reporter.interval = interval
+        self.memory_reporter.start()
+
+    def set_retry_policy(self, task_type: str, policy: RetryPolicy):
+        """设置某类任务的重试和超时策略"""
+        self.retry_policies[task_type] = policy
+
+    def run_queued_tasks(self) -> List[Dict[str, Any]]:
+        """依次执行队列中的任务，按agent_id或agent_type选择空闲智能体"""
+        results = []
+        deferred = []  # 指定的智能体仍有超时任务在运行，留到下次执行
+        while self.task_queue:
+            task = self.task_queue.popleft()
+            agent_id = task.get("agent_id")
+            if agent_id is not None and self.agents.get(agent_id) and self.agents[agent_id].status == "stuck":
+                deferred.append(task)
+                continue
+            agent_id = agent_id or self._find_idle_agent(task.get("agent_type"))
+            if agent_id is None:
+                self.task_queue.appendleft(task)
+                break
+            results.append(self.execute_task(agent_id, task))
+        for task in reversed(deferred):
+            self.task_queue.appendleft(task)
+        return results
+
+    def _find_idle_agent(self, agent_type: Optional[str]) -> Optional[str]:
+        for info in self.agents.values():
+            if info.status == "idle" and info.agent_id in self.agent_instances and (
+                agent_type is None or info.agent_type == agent_type
+            ):
+                return info.agent_id
+        return None
+
+    def execute_task(self, agent_id: str, task: dict) -> Dict[str, Any]:
+        """受监督地执行任务：超时控制、按任务类型重试、异常后恢复智能体状态"""
+        agent = self.agent_instances.get(agent_id)
+        if agent is None:
+            raise ValueError(f"智能体未注册或无实例: {agent_id}")
+            
+        task_id = task.setdefault("task_id", uuid.uuid4().hex)
+        if self.agents[agent_id].status == "stuck":
+            return {
+                "error": f"智能体{agent_id}仍在执行超时的任务",
+                "task_id": task_id,
+                "attempts": 0,
+                "status": "failed"
+            }
+        policy = self.retry_policies.get(task.get("type"), self.default_retry_policy)
+        error = None
+        attempts = 0
+        for attempt in range(1, policy.max_attempts + 1):
+            attempts = attempt
+            if self.journal and task_id not in self._journaled:
+                # 未经dispatch_task排队的任务随第一条记录写入负载
+                self._journal(task_id, "in_flight", agent_id=agent_id, attempt=attempt, task=task)
+                self._journaled.add(task_id)
+            else:
+                self._journal(task_id, "in_flight", agent_id=agent_id, attempt=attempt)
+            try:
+                result = self._run_with_timeout(agent, task, policy.timeout)
+                if (policy.retry_on_failed_status and isinstance(result, dict)
+                        and result.get("status") == "failed"):
+                    error = result.get("error", "任务返回失败状态")
+                else:
+                    self._journal(task_id, "completed", agent_id=agent_id, attempt=attempt)
+                    self._journaled.discard(task_id)
+                    return result
+            except Exception as e:
+                error = str(e) or type(e).__name__
+                print(f"任务{task_id}第{attempt}次执行失败: {error}")
+            finally:
+                self._recover_agent(agent, task)
+                
+            if attempt == policy.max_attempts:
+                break
+            if self.agents[agent_id].status == "stuck":
+                # 超时的尝试仍在运行，不能在同一智能体上重试；未指定agent_id时换同类型的空闲智能体
+                other = None if task.get("agent_id") else self._find_idle_agent(self.agents[agent_id].agent_type)
+                if other is None:
+                    error = f"{error}；智能体{agent_id}仍在执行超时的尝试，无可用智能体重试"
+                    break
+                agent_id, agent = other, self.agent_instances[other]
+            time.sleep(policy.backoff * (2 ** (attempt - 1)))
+                
+        self._journal(task_id, "failed", agent_id=agent_id, error=error)
+        self._journaled.discard(task_id)
+        return {
+            "error": error,
+            "task_id": task_id,
+            "attempts": attempts,
+            "status": "failed"
+        }
+
+    def _run_with_timeout(self, agent, task: dict, timeout: Optional[float]):
+        if timeout is None:
+            return agent.run_task(task)
+            
+        # 每次尝试使用独立的任务对象，超时遗留的线程结束时无法完成较新的尝试
+        attempt_task = dict(task)
+        outcome = {}
+        
+        def target():
+            try:
+                outcome["result"] = agent.run_task(attempt_task)
+            except Exception as e:
+                outcome["error"] = e
+            finally:
+                self._release_worker(agent.agent_id, threading.current_thread())
+                
+        # 超时后工作线程无法强制终止，其结果会被丢弃
+        worker = threading.Thread(target=target, daemon=True)
+        with self._workers_lock:
+            self._workers.setdefault(agent.agent_id, set()).add(worker)
+        worker.start()
+        worker.join(timeout)
+        if worker.is_alive():
+            raise TimeoutError(f"任务执行超时({timeout}s)")
+        if "error" in outcome:
+            raise outcome["error"]
+        return outcome["result"]
+
+    def _release_worker(self, agent_id: str, worker: threading.Thread):
+        """工作线程退出；智能体的超时线程全部退出后才回到空闲"""
+        with self._workers_lock:
+            workers = self._workers.get(agent_id, set())
+            workers.discard(worker)
+            if workers:
+                return
+            self._workers.pop(agent_id, None)
+            if self.agents[agent_id].status == "stuck":
+                self.agent_instances[agent_id].current_task = None
+                self.update_agent_status(agent_id, "idle")
+
+    def _recover_agent(self, agent, task: dict):
+        """本次尝试结束后恢复智能体状态，仍有超时线程在运行时标记为stuck，不再分配新任务
+
+        stuck期间current_task保留给仍在运行的线程，由它结束时自行完成。
+        """
+        with self._workers_lock:
+            if self._workers.get(agent.agent_id):
+                self.update_agent_status(agent.agent_id, "stuck")
+                return
+            agent.current_task = None
+            self.update_agent_status(agent.agent_id, "idle")
+
+    def recover_journal(self) -> List[Dict[str, Any]]:
+        """重启后重放日志中未完成的任务，应在所有智能体注册后调用"""
+        if not self.journal:
+            return []
+        results = []
+        for entry in self.journal.unfinished():
+            task = entry["task"]
+            agent_id = entry.get("agent_id")
+            print(f"恢复未完成任务: {entry['task_id']} ({entry['state']})")
+            self._journaled.add(entry["task_id"])  # 负载已在日志中
+            if agent_id in self.agent_instances:
+                results.append(self.execute_task(agent_id, task))
+            else:
+                self.task_queue.append(task)
+        self.journal.compact()
+        return results
+
+    def _journal(self, task_id: str, state: str, **fields):
+        if self.journal:
+            self.journal.record(task_id, state, **fields)
@@ -0,0 +1,184 @@
+from typing import Any, Callable, ClassVar, Dict, List, Optional
+from dataclasses import dataclass, field
+from collections import deque
+import threading
+import time
+
+# 事件主题
+WEATHER_CHANGED = "weather_changed"
+BALANCE_SUGGESTION = "balance_suggestion"
+DIALOGUE_TURN = "dialogue_turn"
+CONTENT_RECORD = "content_record"
+
+@dataclass(frozen=True)
+class WeatherChanged:
+    topic: ClassVar[str] = WEATHER_CHANGED
+    source: str
+    weather: str
+    time_of_day: str
+    effects: Dict[str, Any] = field(default_factory=dict)
+    timestamp: float = field(default_factory=time.time)
+
+@dataclass(frozen=True)
+class BalanceSuggestion:
+    topic: ClassVar[str] = BALANCE_SUGGESTION
+    source: str
+    suggestions: List[str]
+    success_rate: Optional[float] = None
+    average_completion_time: Optional[float] = None
+    timestamp: float = field(default_factory=time.time)
+
+@dataclass(frozen=True)
+class DialogueTurn:
+    topic: ClassVar[str] = DIALOGUE_TURN
+    source: str
+    player_input: str
+    npc_response: str
+    sentiment: Optional[str] = None
+    timestamp: float = field(default_factory=time.time)
+
+@dataclass(frozen=True)
+class ContentRecord:
+    """结构化生成时每校验通过一条记录发布一次，订阅者可在生成结束前逐条处理"""
+    topic: ClassVar[str] = CONTENT_RECORD
+    source: str
+    task_id: Optional[str]
+    kind: str
+    record: Dict[str, Any]
+    timestamp: float = field(default_factory=time.time)
+
+TOPIC_TYPES = {
+    WEATHER_CHANGED: WeatherChanged,
+    BALANCE_SUGGESTION: BalanceSuggestion,
+    DIALOGUE_TURN: DialogueTurn,
+    CONTENT_RECORD: ContentRecord,
+}
+
+class Subscription:
+    """订阅者：有界队列（满时丢弃最旧事件）+ 独立投递线程，按批次回调"""
+
+    def __init__(self, bus: "EventBus", topic: str, handler: Callable[[List[Any]], None], name: str,
+                 max_queue: int, batch_size: int, max_delay: float):
+        self.bus = bus
+        self.topic = topic
+        self.handler = handler              # 接收事件列表
+        self.name = name
+        self.batch_size = batch_size
+        self.max_delay = max_delay          # 收到首个事件后最多等待多久凑批，0表示立即投递
+        self.stats = {"delivered": 0, "dropped": 0, "batches": 0, "errors": 0}
+        self._queue: deque = deque(maxlen=max_queue)
+        self._cond = threading.Condition()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name=f"event-{name}", daemon=True)
+        self._thread.start()
+
+    def put(self, event):
+        with self._cond:
+            if len(self._queue) == self._queue.maxlen:
+                self.stats["dropped"] += 1
+            self._queue.append(event)
+            self._cond.notify()
+
+    def _take_batch(self) -> Optional[List[Any]]:
+        with self._cond:
+            while not self._queue and not self._closed:
+                self._cond.wait()
+            if not self._queue:
+                return None
+            if self.max_delay > 0 and len(self._queue) < self.batch_size:
+                deadline = time.monotonic() + self.max_delay
+                while len(self._queue) < self.batch_size and not self._closed:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+            count = min(len(self._queue), self.batch_size)
+            return [self._queue.popleft() for _ in range(count)]
+
+    def _run(self):
+        while True:
+            batch = self._take_batch()
+            if batch is None:
+                return
+            try:
+                self.handler(batch)
+            except Exception as e:
+                self.stats["errors"] += 1
+                print(f"事件订阅{self.name}处理失败: {e}")
+            self.stats["delivered"] += len(batch)
+            self.stats["batches"] += 1
+
+    @property
+    def pending(self) -> int:
+        return len(self._queue)
+
+    def close(self, timeout: Optional[float] = None):
+        """停止投递，已入队的事件会先处理完"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        if threading.current_thread() is not self._thread:
+            self._thread.join(timeout)
+
+    def unsubscribe(self):
+        self.bus.unsubscribe(self)
+
+class EventBus:
+    """进程内发布/订阅总线：发布只做非阻塞入队，各订阅者在自己的线程中按批次接收事件"""
+
+    def __init__(self):
+        self.subscriptions: Dict[str, List[Subscription]] = {}
+        self.published: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, topic: str, handler: Callable[[List[Any]], None], name: Optional[str] = None,
+                  max_queue: int = 1000, batch_size: int = 32, max_delay: float = 0.0) -> Subscription:
+        """订阅主题，handler在投递线程中以事件列表调用"""
+        if topic not in TOPIC_TYPES:
+            raise ValueError(f"未知事件主题: {topic}")
+        subscription = Subscription(self, topic, handler, name or f"{topic}-{id(handler):x}",
+                                    max_queue, batch_size, max_delay)
+        with self._lock:
+            self.subscriptions = {
+                **self.subscriptions,
+                topic: self.subscriptions.get(topic, []) + [subscription]
+            }
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            self.subscriptions = {
+                **self.subscriptions,
+                subscription.topic: [s for s in self.subscriptions.get(subscription.topic, [])
+                                     if s is not subscription]
+            }
+        subscription.close()
+
+    def publish(self, event) -> int:
+        """发布事件，返回接收该事件的订阅者数量"""
+        topic = getattr(event, "topic", None)
+        if TOPIC_TYPES.get(topic) is not type(event):
+            raise TypeError(f"不支持的事件类型: {type(event).__name__}")
+        subscribers = self.subscriptions.get(topic, [])  # 订阅表整体替换，读取无需加锁
+        with self._lock:
+            self.published[topic] = self.published.get(topic, 0) + 1
+        for subscription in subscribers:
+            subscription.put(event)
+        return len(subscribers)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "published": dict(self.published),
+            "subscribers": {
+                s.name: {"topic": s.topic, "pending": s.pending, **s.stats}
+                for subs in self.subscriptions.values() for s in subs
+            }
+        }
+
+    def close(self, timeout: Optional[float] = None):
+        """关闭所有订阅"""
+        with self._lock:
+            subscriptions = [s for subs in self.subscriptions.values() for s in subs]
+            self.subscriptions = {}
+        for subscription in subscriptions:
+            subscription.close(timeout)
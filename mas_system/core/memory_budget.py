@@ -0,0 +1,285 @@
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+from dataclasses import dataclass
+from collections import deque
+from datetime import datetime
+import os
+import sys
+import json
+import random
+import threading
+import numpy as np
+import pandas as pd
+
+@dataclass
+class MemoryBudget:
+    """长时间运行时各数据结构的内存上限，超出部分写入磁盘或淘汰"""
+    dialogue_turns: int = 200              # 每个NPC内存中保留的对话轮数，更早的轮次追加到归档文件
+    semantic_cache_entries: int = 100000   # 每个NPC语义缓存的条目数
+    warm_pool_keys: int = 10000            # 预生成池统计频率的键数
+    adjustment_history: int = 1000         # 平衡调整记录条数
+    player_data_rows: int = 100000         # 玩家数据DataFrame保留的最近行数
+    player_data_spill: bool = False        # 超出的玩家数据是否追加写入CSV（否则直接淘汰）
+    task_queue: int = 10000                # 控制器任务队列内存中的任务数，超出部分写入磁盘
+    scene_jobs: int = 1000                 # 场景预览任务结果数
+    spill_dir: str = "data/spill"
+    report_interval: float = 300.0         # 内存报告间隔（秒）
+
+class DialogueRecord:
+    """一轮对话（玩家输入和NPC回应），比dict节省约一半内存"""
+    __slots__ = ("player_input", "npc_response")
+
+    def __init__(self, player_input: str, npc_response: Optional[str] = None):
+        self.player_input = player_input
+        self.npc_response = npc_response
+
+    def to_dict(self) -> Dict[str, Optional[str]]:
+        return {"player_input": self.player_input, "npc_response": self.npc_response}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "DialogueRecord":
+        return cls(data["player_input"], data.get("npc_response"))
+
+class TaskRecord:
+    """排队中的任务：路由字段单独存放，其余内容序列化为紧凑的JSON字节串"""
+    __slots__ = ("task_id", "agent_id", "agent_type", "payload")
+
+    def __init__(self, task_id: Optional[str], agent_id: Optional[str], agent_type: Optional[str], payload):
+        self.task_id = task_id
+        self.agent_id = agent_id
+        self.agent_type = agent_type
+        self.payload = payload  # JSON字节串
+
+    @classmethod
+    def from_task(cls, task: Dict[str, Any]) -> "TaskRecord":
+        """任务必须可JSON序列化（排队的任务可能溢出到磁盘或写入任务日志）"""
+        try:
+            payload = json.dumps(task, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        except (TypeError, ValueError) as e:
+            raise ValueError(f"任务无法JSON序列化: {e}") from e
+        return cls(task.get("task_id"), task.get("agent_id"), task.get("agent_type"), payload)
+
+    def to_task(self) -> Dict[str, Any]:
+        return json.loads(self.payload)
+
+class DialogueHistory:
+    """有界对话历史：内存中只保留最近max_turns轮，更早的轮次追加写入归档JSONL"""
+
+    def __init__(self, max_turns: int = 200, archive_path: Optional[str] = None):
+        self.max_turns = max_turns
+        self.archive_path = archive_path
+        self.archived = 0
+        self._turns: deque = deque()
+
+    def __len__(self) -> int:
+        return len(self._turns)
+
+    def __iter__(self) -> Iterator[DialogueRecord]:
+        return iter(self._turns)
+
+    @property
+    def last(self) -> Optional[DialogueRecord]:
+        return self._turns[-1] if self._turns else None
+
+    def append(self, player_input: str, npc_response: Optional[str] = None) -> DialogueRecord:
+        record = DialogueRecord(player_input, npc_response)
+        self._turns.append(record)
+        if len(self._turns) > self.max_turns:
+            self._spill(len(self._turns) - self.max_turns)
+        return record
+
+    def recent(self, n: int) -> List[DialogueRecord]:
+        """最近n轮，按时间顺序"""
+        n = min(n, len(self._turns))
+        return [self._turns[i] for i in range(len(self._turns) - n, len(self._turns))]
+
+    def load(self, turns: Iterable[Dict[str, Any]]):
+        """从已保存的记录恢复，超出上限的部分写入归档"""
+        self._turns = deque(DialogueRecord.from_dict(turn) for turn in turns)
+        if len(self._turns) > self.max_turns:
+            self._spill(len(self._turns) - self.max_turns)
+
+    def clear(self):
+        self._turns.clear()
+
+    def to_list(self) -> List[Dict[str, Optional[str]]]:
+        return [turn.to_dict() for turn in self._turns]
+
+    def _spill(self, count: int):
+        spilled = [self._turns.popleft() for _ in range(count)]
+        self.archived += count
+        if not self.archive_path:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.archive_path) or ".", exist_ok=True)
+            with open(self.archive_path, "a", encoding="utf-8") as f:
+                for turn in spilled:
+                    f.write(json.dumps(turn.to_dict(), ensure_ascii=False) + "\n")
+        except Exception as e:
+            print(f"归档对话历史失败: {e}")
+
+class SpillQueue:
+    """有界FIFO任务队列：内存中最多max_items个，超出的任务按顺序追加到磁盘，出队时再读回"""
+
+    def __init__(self, max_items: int = 10000, spill_path: Optional[str] = None):
+        self.max_items = max_items
+        self.spill_path = spill_path
+        self.spilled = 0          # 当前在磁盘上的任务数
+        self._memory: deque = deque()
+        self._read_offset = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._memory) + self.spilled
+
+    def __bool__(self) -> bool:
+        return len(self) > 0
+
+    def append(self, task: Dict[str, Any]):
+        record = TaskRecord.from_task(task)
+        with self._lock:
+            if self.spill_path and (self.spilled or len(self._memory) >= self.max_items):
+                self._write_spill(record.payload)
+            else:
+                self._memory.append(record)
+
+    def appendleft(self, task: Dict[str, Any]):
+        """放回队首（刚出队但暂时无法执行的任务）"""
+        with self._lock:
+            self._memory.appendleft(TaskRecord.from_task(task))
+
+    def popleft(self) -> Dict[str, Any]:
+        with self._lock:
+            if not self._memory and self.spilled:
+                self._refill()
+            if not self._memory:
+                raise IndexError("任务队列为空")
+            record = self._memory.popleft()
+        return record.to_task()
+
+    def _write_spill(self, payload: bytes):
+        os.makedirs(os.path.dirname(self.spill_path) or ".", exist_ok=True)
+        with open(self.spill_path, "ab") as f:
+            f.write(payload + b"\n")
+        self.spilled += 1
+
+    def _refill(self):
+        """从磁盘按顺序读回一批任务，读完后删除溢出文件"""
+        with open(self.spill_path, "rb") as f:
+            f.seek(self._read_offset)
+            while len(self._memory) < self.max_items and self.spilled:
+                line = f.readline()
+                if not line:
+                    break
+                self._memory.append(TaskRecord.from_task(json.loads(line)))
+                self.spilled -= 1
+            self._read_offset = f.tell()
+        if not self.spilled:
+            os.remove(self.spill_path)
+            self._read_offset = 0
+
+    def memory_items(self) -> int:
+        return len(self._memory)
+
+def bound_frame(df: pd.DataFrame, max_rows: int, spill_path: Optional[str] = None) -> pd.DataFrame:
+    """只保留最近max_rows行，更早的行写入CSV（指定spill_path时）或直接淘汰"""
+    if len(df) <= max_rows:
+        return df
+    if spill_path:
+        os.makedirs(os.path.dirname(spill_path) or ".", exist_ok=True)
+        df.iloc[:len(df) - max_rows].to_csv(
+            spill_path, mode="a", index=False, header=not os.path.exists(spill_path)
+        )
+    return df.iloc[len(df) - max_rows:].reset_index(drop=True).copy()  # 复制以释放原数据块
+
+def deep_size(obj: Any, sample: int = 200) -> int:
+    """估算对象占用的字节数；大容器按抽样元素的平均大小外推"""
+    seen = set()
+
+    def size(o) -> int:
+        if id(o) in seen:
+            return 0
+        seen.add(id(o))
+        if isinstance(o, pd.DataFrame):
+            return int(o.memory_usage(deep=True).sum())
+        if isinstance(o, np.ndarray):
+            return int(o.nbytes) if o.base is None else sys.getsizeof(o)
+        total = sys.getsizeof(o)
+        if isinstance(o, (str, bytes, int, float, bool)) or o is None:
+            return total
+        if isinstance(o, dict):
+            items = list(o.items())
+            return total + _sampled(items, lambda kv: size(kv[0]) + size(kv[1]))
+        if isinstance(o, (list, tuple, set, frozenset, deque)):
+            return total + _sampled(list(o), size)
+        if hasattr(o, "__dict__"):
+            total += size(vars(o))
+        for slot in getattr(type(o), "__slots__", ()):
+            total += size(getattr(o, slot, None))
+        return total
+
+    def _sampled(items: List[Any], measure: Callable[[Any], int]) -> int:
+        if len(items) <= sample:
+            return sum(measure(item) for item in items)
+        picked = random.Random(0).sample(items, sample)
+        return int(sum(measure(item) for item in picked) * len(items) / sample)
+
+    return size(obj)
+
+def process_rss() -> int:
+    """当前进程的常驻内存（字节）"""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+class MemoryReporter:
+    """定期汇总进程RSS和各智能体主要数据结构的内存占用"""
+
+    def __init__(self, controller, interval: float = 300.0, keep: int = 288):
+        self.controller = controller
+        self.interval = interval
+        self.reports: deque = deque(maxlen=keep)
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def report(self) -> Dict[str, Any]:
+        agents = {}
+        for agent_id, agent in list(self.controller.agent_instances.items()):
+            try:
+                usage = agent.memory_usage()
+            except Exception as e:
+                usage = {"error": str(e)}
+            agents[agent_id] = usage
+        report = {
+            "timestamp": datetime.now().isoformat(),
+            "rss_mb": round(process_rss() / 2 ** 20, 2),
+            "controller": self.controller.memory_usage(),
+            "agents": agents,
+        }
+        self.reports.append(report)
+        return report
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+
+        def loop():
+            while not self._stop.wait(self.interval):
+                report = self.report()
+                top = sorted(
+                    ((agent_id, sum(v for v in usage.values() if isinstance(v, int)))
+                     for agent_id, usage in report["agents"].items()),
+                    key=lambda item: -item[1]
+                )[:5]
+                print(f"内存报告: RSS {report['rss_mb']}MB, " +
+                      ", ".join(f"{agent_id} {total / 2 ** 20:.1f}MB" for agent_id, total in top))
+
+        self._thread = threading.Thread(target=loop, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
@@ -0,0 +1,190 @@
+from typing import Any, Dict, List, Optional, Tuple
+from dataclasses import dataclass, asdict
+from collections import deque
+from contextlib import contextmanager
+import json
+import threading
+import time
+import numpy as np
+
+@dataclass
+class RoutePolicy:
+    tiers: List[str]                       # 按优先级排列的模型，越靠后越快越便宜
+    slo_p95_ms: Optional[float] = None     # p95延迟超过该值时切换到下一级模型，None表示不按延迟切换
+    max_error_rate: Optional[float] = None # 近期错误率超过该值时切换到下一级模型，None表示不按错误率切换
+    short_input_chars: int = 0             # 输入短于该长度时直接从short_tier开始
+    short_tier: int = 1
+
+# 默认路由策略：短对话和情感分析用更快的模型，故事生成保持qwen-max
+DEFAULT_ROUTE_POLICIES = {
+    "npc_dialogue": RoutePolicy(["qwen-max", "qwen-plus", "qwen-turbo"], slo_p95_ms=3000, max_error_rate=0.2,
+                                short_input_chars=20),
+    "npc_emotional": RoutePolicy(["qwen-max", "qwen-plus", "qwen-turbo"], slo_p95_ms=3000, max_error_rate=0.2,
+                                 short_input_chars=20),
+    "npc_pregenerate": RoutePolicy(["qwen-plus", "qwen-turbo"], max_error_rate=0.2),
+    "sentiment": RoutePolicy(["qwen-turbo"]),
+    "storyline": RoutePolicy(["qwen-max", "qwen-plus"], slo_p95_ms=30000, max_error_rate=0.2),
+    "story_section": RoutePolicy(["qwen-max", "qwen-plus"], slo_p95_ms=20000, max_error_rate=0.2),
+    "characters": RoutePolicy(["deepseek-chat"]),
+    "elements": RoutePolicy(["deepseek-chat"]),
+}
+
+class RouteCall:
+    """一次路由调用，调用方在请求失败时将ok置为False"""
+
+    def __init__(self, route: str, model: str):
+        self.route = route
+        self.model = model
+        self.ok = True
+
+class ModelRouter:
+    """按任务类型选择模型，记录各模型的实际延迟和错误，p95超过SLO或错误率过高时切换到下一级模型
+
+    延迟只统计成功调用（快速失败的请求不会拉低p95），错误率单独统计。两者都只看最近
+    window_seconds内的样本，被降级的模型在样本过期后会重新被选用，从而在服务恢复后
+    自动回到首选模型。
+    """
+
+    def __init__(self, policies: Optional[Dict[str, RoutePolicy]] = None, config_path: Optional[str] = None,
+                 window_seconds: float = 300.0, window_size: int = 200, min_samples: int = 5):
+        self.policies: Dict[str, RoutePolicy] = dict(DEFAULT_ROUTE_POLICIES if policies is None else policies)
+        self.window_seconds = window_seconds
+        self.window_size = window_size
+        self.min_samples = min_samples    # 样本少于该数量时不判断是否超出SLO
+        self._samples: Dict[Tuple[str, str], deque] = {}    # 成功调用的(时间, 延迟)
+        self._outcomes: Dict[Tuple[str, str], deque] = {}   # 全部调用的(时间, 是否成功)
+        self._route_stats: Dict[str, Dict[str, int]] = {}
+        self._model_stats: Dict[Tuple[str, str], Dict[str, int]] = {}
+        self._lock = threading.Lock()
+        if config_path:
+            self.load_policies(config_path)
+
+    def set_policy(self, route: str, policy: RoutePolicy):
+        """设置某类任务的模型路由策略"""
+        if not policy.tiers:
+            raise ValueError("路由策略至少需要一个模型")
+        with self._lock:
+            self.policies[route] = policy
+
+    def load_policies(self, path: str):
+        """从JSON文件加载策略，格式为{route: {"tiers": [...], "slo_p95_ms": ...}}"""
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                config = json.load(f)
+        except FileNotFoundError:
+            return
+        for route, values in config.items():
+            self.set_policy(route, RoutePolicy(**values))
+
+    def _policy(self, route: str) -> RoutePolicy:
+        policy = self.policies.get(route)
+        if policy is None:
+            raise ValueError(f"未配置模型路由: {route}")
+        return policy
+
+    def _p95(self, route: str, model: str, now: float) -> Optional[float]:
+        samples = self._samples.get((route, model))
+        if not samples:
+            return None
+        recent = [latency for timestamp, latency in samples if now - timestamp <= self.window_seconds]
+        if len(recent) < self.min_samples:
+            return None
+        return float(np.percentile(recent, 95))
+
+    def _error_rate(self, route: str, model: str, now: float) -> Optional[float]:
+        outcomes = self._outcomes.get((route, model))
+        if not outcomes:
+            return None
+        recent = [ok for timestamp, ok in outcomes if now - timestamp <= self.window_seconds]
+        if len(recent) < self.min_samples:
+            return None
+        return 1.0 - sum(recent) / len(recent)
+
+    def _healthy(self, route: str, policy: RoutePolicy, model: str, now: float) -> bool:
+        if policy.slo_p95_ms is not None:
+            p95 = self._p95(route, model, now)
+            if p95 is not None and p95 > policy.slo_p95_ms:
+                return False
+        if policy.max_error_rate is not None:
+            error_rate = self._error_rate(route, model, now)
+            if error_rate is not None and error_rate > policy.max_error_rate:
+                return False
+        return True
+
+    def select(self, route: str, input_chars: Optional[int] = None) -> str:
+        """为一次调用选择模型"""
+        policy = self._policy(route)
+        now = time.time()
+        with self._lock:
+            stats = self._route_stats.setdefault(route, {"requests": 0, "short_routed": 0, "failovers": 0})
+            stats["requests"] += 1
+            start = 0
+            if input_chars is not None and input_chars < policy.short_input_chars:
+                start = min(policy.short_tier, len(policy.tiers) - 1)
+                stats["short_routed"] += 1
+            model = policy.tiers[-1]
+            for tier in range(start, len(policy.tiers)):
+                if self._healthy(route, policy, policy.tiers[tier], now):
+                    model = policy.tiers[tier]
+                    break
+            if model != policy.tiers[start]:
+                stats["failovers"] += 1
+        return model
+
+    def record(self, route: str, model: str, latency_ms: float, ok: bool = True):
+        """记录一次调用的结果，只有成功调用计入延迟窗口"""
+        now = time.time()
+        with self._lock:
+            key = (route, model)
+            outcomes = self._outcomes.get(key)
+            if outcomes is None:
+                outcomes = self._outcomes[key] = deque(maxlen=self.window_size)
+            outcomes.append((now, ok))
+            if ok:
+                samples = self._samples.get(key)
+                if samples is None:
+                    samples = self._samples[key] = deque(maxlen=self.window_size)
+                samples.append((now, latency_ms))
+            stats = self._model_stats.setdefault(key, {"calls": 0, "errors": 0})
+            stats["calls"] += 1
+            if not ok:
+                stats["errors"] += 1
+
+    @contextmanager
+    def route(self, route: str, input_chars: Optional[int] = None):
+        """选择模型并记录with块内调用的耗时，块内抛出异常视为失败"""
+        call = RouteCall(route, self.select(route, input_chars))
+        start = time.perf_counter()
+        try:
+            yield call
+        except Exception:
+            call.ok = False
+            raise
+        finally:
+            self.record(route, call.model, (time.perf_counter() - start) * 1000, call.ok)
+
+    def stats(self) -> Dict[str, Any]:
+        """各路由的请求数、降级次数以及各模型的调用数、错误数和延迟分位数"""
+        now = time.time()
+        with self._lock:
+            routes = {}
+            for route, policy in self.policies.items():
+                models = {}
+                for model in policy.tiers:
+                    key = (route, model)
+                    if key not in self._model_stats:
+                        continue
+                    latencies = [latency for _, latency in self._samples.get(key, ())]
+                    models[model] = {
+                        **self._model_stats[key],
+                        "p50_ms": round(float(np.percentile(latencies, 50)), 2) if latencies else None,
+                        "p95_ms": round(float(np.percentile(latencies, 95)), 2) if latencies else None,
+                        "error_rate": self._error_rate(route, model, now),
+                        "over_slo": not self._healthy(route, policy, model, now),
+                    }
+                routes[route] = {
+                    **self._route_stats.get(route, {"requests": 0, "short_routed": 0, "failovers": 0}),
+                    "policy": asdict(policy),
+                    "models": models,
+                }
+            return {"routes": routes}
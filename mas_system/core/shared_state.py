@@ -0,0 +1,320 @@
+from typing import Any, Dict, List, Optional
+from multiprocessing import shared_memory, resource_tracker
+import os
+import json
+import atexit
+import time
+import numpy as np
+import pandas as pd
+
+# 共享状态层：基于multiprocessing.shared_memory或内存映射文件，
+# 在多个进程间以零拷贝方式读取遥测数组、对话历史环和小型状态。
+# 每个共享块只允许一个写进程；读进程通过序列号检测并重试被并发写入的读取。
+
+HEADER_BYTES = 512
+_META_OFFSET = 32  # 前32字节为4个int64计数器：[seq, count, 保留, 保留]
+
+# 本进程打开的共享内存块，在显式close之前保持映射，避免块对象被回收时关闭仍被视图引用的内存
+_OPEN_BLOCKS = set()
+# close时仍有视图引用映射的SharedMemory，保持引用直到视图释放后再关闭
+_PENDING_HANDLES = set()
+# 本进程创建的共享内存名称；同进程附加时登记与创建时的登记是同一条，不能撤销
+_CREATED_NAMES = set()
+
+def _close_handle(handle: shared_memory.SharedMemory) -> bool:
+    try:
+        handle.close()
+        return True
+    except BufferError:
+        return False
+
+def _close_pending_handles():
+    for handle in list(_PENDING_HANDLES):
+        if _close_handle(handle):
+            _PENDING_HANDLES.discard(handle)
+
+@atexit.register
+def _close_open_blocks():
+    for block in list(_OPEN_BLOCKS):
+        block.close()
+    _close_pending_handles()
+
+def _attach_untracked(name: str) -> shared_memory.SharedMemory:
+    """附加到已有共享内存但不登记到resource_tracker，避免附加进程退出时将其删除"""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)  # Python 3.13+
+    except TypeError:
+        pass
+    handle = shared_memory.SharedMemory(name=name)
+    if os.name == "posix" and name not in _CREATED_NAMES:  # 3.13之前附加时也会登记，立即撤销
+        resource_tracker.unregister(handle._name, "shared_memory")
+    return handle
+
+def _view(buffer, dtype, shape, offset: int = 0) -> np.ndarray:
+    """共享缓冲区上的数组视图；frombuffer会持有缓冲区导出，视图存活期间映射不会被提前关闭"""
+    count = int(np.prod(shape))
+    return np.frombuffer(buffer, dtype=dtype, count=count, offset=offset).reshape(shape)
+
+class _SharedBlock:
+    """共享内存块：头部为计数器和JSON元数据，其后为数据区"""
+
+    def __init__(self, name: str, buffer, handle, meta: Dict[str, Any], owner: bool):
+        self.name = name
+        self.meta = meta
+        self.owner = owner
+        self._handle = handle
+        self._buffer = buffer
+        if isinstance(handle, shared_memory.SharedMemory):
+            _OPEN_BLOCKS.add(self)
+        self.counters = _view(buffer, np.int64, (4,))
+
+    @classmethod
+    def _create(cls, name: Optional[str], data_bytes: int, meta: Dict[str, Any], path: Optional[str] = None):
+        encoded = json.dumps(meta, ensure_ascii=False).encode("utf-8")
+        if len(encoded) > HEADER_BYTES - _META_OFFSET:
+            raise ValueError("共享块元数据过长")
+        total = HEADER_BYTES + data_bytes
+        if path:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            with open(path, "wb") as f:
+                f.truncate(total)
+            handle = np.memmap(path, dtype=np.uint8, mode="r+", shape=(total,))
+            buffer, name = handle, path
+        else:
+            handle = shared_memory.SharedMemory(name=name, create=True, size=total)
+            buffer, name = handle.buf, handle.name
+            _CREATED_NAMES.add(name)
+        _view(buffer, np.int64, (4,))[:] = 0
+        header = _view(buffer, np.uint8, (HEADER_BYTES - _META_OFFSET,), _META_OFFSET)
+        header[:] = 0
+        header[:len(encoded)] = np.frombuffer(encoded, dtype=np.uint8)
+        return cls(name, buffer, handle, meta, owner=True)
+
+    @classmethod
+    def _attach(cls, name: str, path: Optional[str] = None):
+        if path:
+            handle = np.memmap(path, dtype=np.uint8, mode="r+")
+            buffer, name = handle, path
+        else:
+            handle = _attach_untracked(name)
+            buffer = handle.buf
+        raw = bytes(_view(buffer, np.uint8, (HEADER_BYTES - _META_OFFSET,), _META_OFFSET))
+        meta = json.loads(raw.rstrip(b"\x00").decode("utf-8"))
+        return cls(name, buffer, handle, meta, owner=False)
+
+    def _data(self, dtype, shape, offset: int = 0) -> np.ndarray:
+        return _view(self._buffer, dtype, shape, HEADER_BYTES + offset)
+
+    def _read_consistent(self, read):
+        """序列号为奇数表示正在写入，读前后序列号不一致则重试"""
+        while True:
+            before = int(self.counters[0])
+            if before % 2 == 0:
+                value = read()
+                if int(self.counters[0]) == before:
+                    return value
+            time.sleep(0)
+
+    def _begin_write(self):
+        self.counters[0] += 1
+
+    def _end_write(self):
+        self.counters[0] += 1
+
+    def close(self):
+        """释放本进程的映射；创建者同时删除共享内存名称
+
+        仍有视图（如frame返回的DataFrame）引用映射时，映射推迟到视图释放后的下一次close或进程退出时关闭。
+        """
+        if self.counters is None:
+            return
+        self.counters = None
+        if isinstance(self._handle, np.memmap):
+            self._handle.flush()
+            self._handle = None
+            return
+        self._buffer = None
+        _OPEN_BLOCKS.discard(self)
+        handle, self._handle = self._handle, None
+        _close_pending_handles()
+        if not _close_handle(handle):
+            # 仍有视图引用映射：保留handle，下次close或进程退出时重试，
+            # 避免handle被回收时在__del__中close并抛出BufferError
+            _PENDING_HANDLES.add(handle)
+        if self.owner:
+            _CREATED_NAMES.discard(self.name)
+            handle.unlink()  # 只删除名称，已有映射（包括其他进程的）不受影响
+
+class SharedTelemetryRing(_SharedBlock):
+    """定长数值列的环形缓冲区，如(timestamp, completion_time, attempts, success)"""
+
+    @classmethod
+    def create(cls, columns: List[str], capacity: int, name: Optional[str] = None,
+               path: Optional[str] = None) -> "SharedTelemetryRing":
+        meta = {"kind": "telemetry", "columns": list(columns), "capacity": capacity}
+        return cls._create(name, capacity * len(columns) * 8, meta, path)
+
+    @classmethod
+    def attach(cls, name: str, path: Optional[str] = None) -> "SharedTelemetryRing":
+        return cls._attach(name, path)
+
+    @property
+    def columns(self) -> List[str]:
+        return self.meta["columns"]
+
+    @property
+    def data(self) -> np.ndarray:
+        """整个环形区的零拷贝视图，形状(capacity, 列数)；不受序列号保护，需要一致快照时用latest()"""
+        return self._data(np.float64, (self.meta["capacity"], len(self.columns)))
+
+    @property
+    def count(self) -> int:
+        """累计写入的行数"""
+        return int(self.counters[1])
+
+    def append(self, rows: np.ndarray):
+        rows = np.asarray(rows, dtype=np.float64).reshape(-1, len(self.columns))
+        capacity = self.meta["capacity"]
+        if len(rows) > capacity:
+            rows = rows[-capacity:]
+        start = self.count
+        idx = (start + np.arange(len(rows))) % capacity
+        self._begin_write()
+        self.data[idx] = rows
+        self.counters[1] = start + len(rows)
+        self._end_write()
+
+    def latest(self, n: Optional[int] = None) -> np.ndarray:
+        """按写入顺序返回最近n行的副本
+
+        复制在序列号检查之内完成，返回的数据保证是一致的快照；data视图是零拷贝的，
+        但写进程绕回环形区后内容会被覆盖。
+        """
+        def read():
+            capacity = self.meta["capacity"]
+            count = self.count
+            size = min(count, capacity) if n is None else min(n, count, capacity)
+            start = (count - size) % capacity
+            if start + size <= capacity:
+                return self.data[start:start + size].copy()
+            return np.concatenate([self.data[start:], self.data[:start + size - capacity]])
+        return self._read_consistent(read)
+
+    def frame(self, n: Optional[int] = None) -> pd.DataFrame:
+        return pd.DataFrame(self.latest(n), columns=self.columns, copy=False)
+
+class SharedHistoryRing(_SharedBlock):
+    """对话历史环：每个槽位存放UTF-8编码的玩家输入和NPC回应（超长截断）"""
+
+    @classmethod
+    def create(cls, capacity: int = 256, slot_bytes: int = 2048, name: Optional[str] = None,
+               path: Optional[str] = None) -> "SharedHistoryRing":
+        meta = {"kind": "history", "capacity": capacity, "slot_bytes": slot_bytes}
+        return cls._create(name, capacity * (8 + slot_bytes), meta, path)
+
+    @classmethod
+    def attach(cls, name: str, path: Optional[str] = None) -> "SharedHistoryRing":
+        return cls._attach(name, path)
+
+    def _slots(self):
+        capacity, slot_bytes = self.meta["capacity"], self.meta["slot_bytes"]
+        lengths = self._data(np.int32, (capacity, 2))
+        payload = self._data(np.uint8, (capacity, slot_bytes), offset=capacity * 8)
+        return lengths, payload
+
+    @staticmethod
+    def _truncate(data: bytes, limit: int) -> bytes:
+        return data[:limit].decode("utf-8", errors="ignore").encode("utf-8")
+
+    def append(self, player_input: str, npc_response: Optional[str]):
+        capacity, slot_bytes = self.meta["capacity"], self.meta["slot_bytes"]
+        question = self._truncate((player_input or "").encode("utf-8"), slot_bytes // 2)
+        answer = self._truncate((npc_response or "").encode("utf-8"), slot_bytes - len(question))
+        lengths, payload = self._slots()
+        slot = int(self.counters[1]) % capacity
+        self._begin_write()
+        lengths[slot] = (len(question), len(answer) if npc_response is not None else -1)
+        payload[slot, :len(question)] = np.frombuffer(question, dtype=np.uint8)
+        payload[slot, len(question):len(question) + len(answer)] = np.frombuffer(answer, dtype=np.uint8)
+        self.counters[1] += 1
+        self._end_write()
+
+    def recent(self, n: int = 5) -> List[Dict[str, Optional[str]]]:
+        """返回最近n轮对话（与dialogue_history的记录格式相同）"""
+        def read():
+            capacity = self.meta["capacity"]
+            lengths, payload = self._slots()
+            count = int(self.counters[1])
+            turns = []
+            for i in range(max(count - min(n, capacity), 0), count):
+                slot = i % capacity
+                q_len, a_len = (int(v) for v in lengths[slot])
+                raw = payload[slot].tobytes()
+                turns.append({
+                    "player_input": raw[:q_len].decode("utf-8"),
+                    "npc_response": raw[q_len:q_len + a_len].decode("utf-8") if a_len >= 0 else None
+                })
+            return turns
+        return self._read_consistent(read)
+
+class SharedStateBlock(_SharedBlock):
+    """小型JSON状态（如当前天气），整体覆盖写入"""
+
+    @classmethod
+    def create(cls, size: int = 4096, name: Optional[str] = None,
+               path: Optional[str] = None) -> "SharedStateBlock":
+        return cls._create(name, size, {"kind": "state", "size": size}, path)
+
+    @classmethod
+    def attach(cls, name: str, path: Optional[str] = None) -> "SharedStateBlock":
+        return cls._attach(name, path)
+
+    def write(self, state: Dict[str, Any]):
+        encoded = json.dumps(state, ensure_ascii=False, default=str).encode("utf-8")
+        if len(encoded) > self.meta["size"]:
+            raise ValueError("共享状态超出容量")
+        area = self._data(np.uint8, (self.meta["size"],))
+        self._begin_write()
+        area[:len(encoded)] = np.frombuffer(encoded, dtype=np.uint8)
+        self.counters[1] = len(encoded)
+        self._end_write()
+
+    def read(self) -> Dict[str, Any]:
+        def read():
+            length = int(self.counters[1])
+            return bytes(self._data(np.uint8, (length,)))
+        raw = self._read_consistent(read)
+        return json.loads(raw.decode("utf-8")) if raw else {}
+
+class SharedFrame(_SharedBlock):
+    """将DataFrame的数值列按列连续存放，其他进程附加后直接得到基于共享内存的DataFrame"""
+
+    @classmethod
+    def publish(cls, df: pd.DataFrame, name: Optional[str] = None,
+                path: Optional[str] = None) -> "SharedFrame":
+        numeric = df.select_dtypes(include="number")
+        meta = {"kind": "frame", "columns": [str(c) for c in numeric.columns], "rows": len(numeric)}
+        block = cls._create(name, max(numeric.size, 1) * 8, meta, path)
+        block._begin_write()
+        block.values[:] = numeric.to_numpy(dtype=np.float64).T
+        block.counters[1] = len(numeric)
+        block._end_write()
+        return block
+
+    @classmethod
+    def attach(cls, name: str, path: Optional[str] = None) -> "SharedFrame":
+        return cls._attach(name, path)
+
+    @property
+    def values(self) -> np.ndarray:
+        """形状(列数, 行数)的零拷贝视图，每列在内存中连续"""
+        return self._data(np.float64, (len(self.meta["columns"]), self.meta["rows"]))
+
+    @property
+    def frame(self) -> pd.DataFrame:
+        """基于共享内存的零拷贝DataFrame；发布后内容不再变化"""
+        values = self.values
+        return pd.DataFrame(
+            {column: values[i] for i, column in enumerate(self.meta["columns"])},
+            copy=False
+        )
@@ -0,0 +1,78 @@
+from typing import Any, Dict, List
+import os
+import json
+import threading
+from datetime import datetime
+
+class TaskJournal:
+    """任务日志：以JSONL追加记录任务状态变化，重启后可找回未完成的任务
+
+    每条记录都会fsync，吞吐受磁盘同步延迟限制（通常每秒数千条）。任务负载只随第一条记录写入，
+    每累计compact_every个结束的任务压缩一次日志，只保留未完成任务。
+    """
+
+    def __init__(self, path: str = "data/task_journal.jsonl", compact_every: int = 1000):
+        self.path = path
+        self.compact_every = compact_every
+        self._finished = 0   # 上次压缩后结束的任务数
+        self._lock = threading.Lock()
+
+    def record(self, task_id: str, state: str, **fields):
+        """追加一条状态记录（pending/in_flight/completed/failed）"""
+        entry = {
+            "task_id": task_id,
+            "state": state,
+            "timestamp": datetime.now().isoformat(),
+            **fields
+        }
+        line = json.dumps(entry, ensure_ascii=False, default=str) + "\n"
+        with self._lock:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line)
+                f.flush()
+                os.fsync(f.fileno())
+            if state in ("completed", "failed"):
+                self._finished += 1
+                if self._finished >= self.compact_every:
+                    self._compact()
+
+    def unfinished(self) -> List[Dict[str, Any]]:
+        """返回最后状态为pending或in_flight的任务记录"""
+        with self._lock:
+            return self._unfinished()
+
+    def _unfinished(self) -> List[Dict[str, Any]]:
+        latest: Dict[str, Dict[str, Any]] = {}
+        tasks: Dict[str, Dict[str, Any]] = {}
+        if not os.path.exists(self.path):
+            return []
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # 崩溃时可能留下不完整的最后一行
+                latest[entry["task_id"]] = entry
+                if "task" in entry:
+                    tasks[entry["task_id"]] = entry
+        return [
+            {**tasks[task_id], "state": entry["state"],
+             "agent_id": entry.get("agent_id", tasks[task_id].get("agent_id"))}
+            for task_id, entry in latest.items()
+            if entry["state"] in ("pending", "in_flight") and task_id in tasks
+        ]
+
+    def compact(self):
+        """只保留未完成任务的记录，避免日志无限增长"""
+        with self._lock:
+            self._compact()
+
+    def _compact(self):
+        pending = self._unfinished()
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for entry in pending:
+                f.write(json.dumps(entry, ensure_ascii=False, default=str) + "\n")
+        os.replace(tmp_path, self.path)
+        self._finished = 0
@@ -0,0 +1,135 @@
+from typing import Any, Callable, Dict, List, Optional
+from collections import Counter, deque
+import threading
+import time
+
+class WarmPool:
+    """预生成池：统计高频请求键，在空闲时后台预生成多个结果并轮换返回"""
+
+    def __init__(self, generator: Callable[[str], Any],
+                 variants_per_key: int = 3,
+                 top_k: int = 10,
+                 budget: int = 100,
+                 budget_window: float = 3600.0,
+                 idle_check: Optional[Callable[[], bool]] = None,
+                 interval: float = 1.0,
+                 max_keys: int = 10000):
+        self.generator = generator              # key -> 生成结果，返回None表示失败
+        self.variants_per_key = variants_per_key
+        self.top_k = top_k
+        self.budget = budget                    # 每个预算窗口内最多预生成次数
+        self.budget_window = budget_window
+        self.idle_check = idle_check or (lambda: True)
+        self.interval = interval
+        self.max_keys = max_keys                # 频率统计最多保留的键数，超出时只留下高频的一半
+        self.frequencies: Counter = Counter()
+        self.pool: Dict[str, deque] = {}
+        self.stats = {"hits": 0, "misses": 0, "generated": 0, "failed": 0}
+        self._spent: deque = deque()            # 窗口内各次预生成的时间戳
+        self._generation = 0                    # 失效计数，丢弃失效前开始的生成结果
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def record(self, key: str, count: int = 1):
+        """记录一次请求，用于学习高频键"""
+        with self._lock:
+            self.frequencies[key] += count
+            self._trim()
+
+    def get(self, key: str) -> Optional[Any]:
+        """命中时返回预生成结果并轮换到队尾，未命中返回None"""
+        with self._lock:
+            self.frequencies[key] += 1
+            self._trim()
+            variants = self.pool.get(key)
+            if not variants:
+                self.stats["misses"] += 1
+                return None
+            value = variants[0]
+            variants.rotate(-1)
+            self.stats["hits"] += 1
+            return value
+
+    def _trim(self):
+        if len(self.frequencies) > self.max_keys:
+            self.frequencies = Counter(dict(self.frequencies.most_common(self.max_keys // 2)))
+            for key in [k for k in self.pool if k not in self.frequencies]:
+                del self.pool[key]
+
+    def invalidate(self, key: Optional[str] = None):
+        """清空全部或指定键的预生成结果（如NPC性格变化时）"""
+        with self._lock:
+            if key is None:
+                self.pool.clear()
+            else:
+                self.pool.pop(key, None)
+            self._generation += 1
+
+    def top_keys(self) -> List[str]:
+        with self._lock:
+            return [key for key, _ in self.frequencies.most_common(self.top_k)]
+
+    def budget_remaining(self) -> int:
+        now = time.time()
+        with self._lock:
+            while self._spent and now - self._spent[0] > self.budget_window:
+                self._spent.popleft()
+            return self.budget - len(self._spent)
+
+    def fill_once(self) -> bool:
+        """为最缺预生成结果的高频键生成一条，返回是否执行了生成"""
+        if self.budget_remaining() <= 0 or not self.idle_check():
+            return False
+
+        with self._lock:
+            candidates = [
+                key for key, _ in self.frequencies.most_common(self.top_k)
+                if len(self.pool.get(key, ())) < self.variants_per_key
+            ]
+            if not candidates:
+                return False
+            key = min(candidates, key=lambda k: len(self.pool.get(k, ())))
+            generation = self._generation
+            self._spent.append(time.time())
+
+        try:
+            value = self.generator(key)
+        except Exception as e:
+            print(f"预生成失败[{key}]: {e}")
+            value = None
+
+        with self._lock:
+            if value is None:
+                self.stats["failed"] += 1
+            elif generation == self._generation:
+                self.pool.setdefault(key, deque()).append(value)
+                self.stats["generated"] += 1
+        return True
+
+    def start(self):
+        """启动后台预生成线程"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.is_set():
+            if not self.fill_once():
+                self._stop.wait(self.interval)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                **self.stats,
+                "keys": len(self.pool),
+                "variants": sum(len(v) for v in self.pool.values()),
+            }